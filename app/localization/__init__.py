@@ -1,4 +1,7 @@
+from collections import OrderedDict
+
 from services.lib.db import DB
+from services.lib.state_cache import STR
 from localization.base import BaseLocalization
 from localization.eng import EnglishLocalization
 from localization.rus import RussianLocalization
@@ -6,7 +9,10 @@ from services.lib.utils import Singleton
 
 
 class LocalizationManager(metaclass=Singleton):
+    MAX_CACHED_USERS = 10000
+
     def __init__(self):
+        self._user_locs = OrderedDict()  # chat_id -> BaseLocalization, LRU order
         self._langs = {
             # 'rus': RussianLocalization(),
             'eng': EnglishLocalization()
@@ -21,15 +27,22 @@ class LocalizationManager(metaclass=Singleton):
         return f'user:lang:{chat_id}'
 
     async def get_lang(self, chat_id, db: DB):
-        redis = await db.get_redis()
-        lang = await redis.get(self.lang_key(chat_id))
-        return lang.decode() if lang else None
+        return await db.state.get(self.lang_key(chat_id), STR) or None
 
     async def set_lang(self, chat_id, lang, db: DB):
-        redis = await db.get_redis()
-        await redis.set(self.lang_key(chat_id), str(lang))
+        db.state.set(self.lang_key(chat_id), lang, STR)
+        self._user_locs.pop(chat_id, None)
         return await self.get_from_db(chat_id, db)
 
     async def get_from_db(self, chat_id, db: DB):
+        loc = self._user_locs.get(chat_id)
+        if loc is not None:
+            self._user_locs.move_to_end(chat_id)
+            return loc
+
         lang = await self.get_lang(chat_id, db)
-        return self.get_from_lang(lang)
+        loc = self.get_from_lang(lang)
+        self._user_locs[chat_id] = loc
+        if len(self._user_locs) > self.MAX_CACHED_USERS:
+            self._user_locs.popitem(last=False)
+        return loc
@@ -9,17 +9,24 @@ from aiogram.types import *
 
 from localization import LocalizationManager
 from services.dialog import init_dialogs
+from services.fetch.base import DelegateQueue
 from services.fetch.cap import CapInfoFetcher
 from services.fetch.gecko_price import fill_rune_price_from_gecko
 from services.fetch.node_ip_manager import ThorNodeAddressManager
 from services.fetch.pool_price import PoolPriceFetcher
 from services.fetch.queue import QueueFetcher
+from services.fetch.thor_cache import ImmutableResponseCache
 from services.fetch.thor_node import ThorNode
 from services.fetch.tx import StakeTxFetcher
 from services.lib.config import Config
+from services.lib.datetime import parse_timespan_to_seconds
 from services.lib.db import DB
 from services.lib.depcont import DepContainer
+from services.lib.http_client import HttpClient
+from services.lib.retention import RetentionRegistry
+from services.lib.scheduler import FixedRateScheduler
 from services.models.price import LastPriceHolder
+from services.models.time_series import TimeSeries, TimeSeriesCompactor, PriceTimeSeries, RUNE_SYMBOL
 from services.notify.broadcast import Broadcaster
 from services.notify.types.cap_notify import CapFetcherNotifier
 from services.notify.types.pool_churn import PoolChurnNotifier
@@ -45,6 +52,9 @@ class App:
 
         # d.loop = asyncio.get_event_loop()
         d.db = DB(d.loop)
+
+        ts_cfg = d.cfg.get('time_series') or {}
+        TimeSeries.configure_retention(RetentionRegistry.from_config(ts_cfg.get('retention')))
         #
         # d.price_holder = LastPriceHolder()
 
@@ -65,18 +75,27 @@ class App:
     async def create_thor_node_connector(self):
         d = self.deps
         cfg = d.cfg.thornode
-        d.thor_man = ThorNodeAddressManager(cfg.seed)
+        refresh_period = parse_timespan_to_seconds(cfg.get('refresh_period', '10m'))
+        d.thor_man = ThorNodeAddressManager(cfg.seed, refresh_period=refresh_period)
         d.thor_man.session = d.session
         d.thor_nodes = ThorNode(d.thor_man, d.session,
                                 cohort_size=cfg.consensus.cohort,
-                                consensus=cfg.consensus.agree)
+                                consensus=cfg.consensus.agree,
+                                early_quorum=bool(cfg.consensus.get('early_quorum', True)),
+                                cache=ImmutableResponseCache(d.db))
         await d.thor_man.reload_nodes_ip()
+        d.thor_man.start_refresher()
 
     async def _run_background_jobs(self):
         d = self.deps
 
+        # asyncio.create_task(TimeSeriesCompactor(d.db).run())
+        #
         # if 'REPLACE_RUNE_TIMESERIES_WITH_GECKOS' in os.environ:
-        #     await fill_rune_price_from_gecko(d.db)
+        #     await fill_rune_price_from_gecko(d.db, d.session)
+        #
+        # price_cache_horizon = parse_timespan_to_seconds(d.cfg.price.get('history_cache', '8d'))
+        # await PriceTimeSeries(RUNE_SYMBOL, d.db).warm_up(price_cache_horizon)
         #
         # self.ppf = PoolPriceFetcher(d)
         # await self.ppf.get_current_pool_data_full()
@@ -94,26 +113,48 @@ class App:
         # fetcher_cap.subscribe(notifier_cap)
         # fetcher_tx.subscribe(notifier_tx)
         # fetcher_queue.subscribe(notifier_queue)
-        # self.ppf.subscribe(notifier_price)
-        # self.ppf.subscribe(notifier_pool_churn)
+        # self.ppf.subscribe(notifier_price, policy=DelegateQueue.COALESCE)  # only the latest price matters
+        # self.ppf.subscribe(notifier_pool_churn, policy=DelegateQueue.COALESCE)
         #
-        # await asyncio.gather(*(task.run() for task in [
+        # await self.make_scheduler([
         #     self.ppf,
         #     fetcher_tx,
         #     fetcher_cap,
         #     fetcher_queue,
-        # ]))
+        # ]).run()
+
+    def make_scheduler(self, fetchers):
+        """
+        Fixed-rate schedule for the fetchers. Unless "scheduler.offsets" sets it explicitly,
+        the phase of the i-th fetcher is spread evenly over the shortest period.
+        """
+        cfg = self.deps.cfg.get('scheduler') or {}
+        jitter = float(cfg.get('jitter', 0.0))
+        offsets = cfg.get('offsets') or {}
+        start_delay = float(cfg.get('start_delay', 1.0))
+
+        scheduler = FixedRateScheduler(start_delay=start_delay)
+        min_period = min(f.sleep_period for f in fetchers)
+        for i, fetcher in enumerate(fetchers):
+            offset = offsets.get(fetcher.name)
+            offset = parse_timespan_to_seconds(str(offset)) if offset is not None else i * min_period / len(fetchers)
+            scheduler.add(fetcher.run_once, lambda f=fetcher: f.sleep_period,  # may change if adaptive
+                          offset=offset, jitter=jitter, name=fetcher.name)
+        return scheduler
 
     async def on_startup(self, _):
         await self.connect_chat_storage()
 
-        # self.deps.session = aiohttp.ClientSession(json_serialize=ujson.dumps)
+        d = self.deps
+        d.http = HttpClient.from_config(d.cfg)
+        d.session = d.http.session
         # await self.create_thor_node_connector()
 
         asyncio.create_task(self._run_background_jobs())
 
     async def on_shutdown(self, _):
-        await self.deps.session.close()
+        await self.deps.db.state.flush()
+        await self.deps.http.close()
 
     def run_bot(self):
         self.create_bot_stuff()
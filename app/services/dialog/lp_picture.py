@@ -7,7 +7,7 @@ from datetime import datetime
 from typing import List
 
 import aiofiles
-import aiohttp
+from aiohttp import ClientSession
 from PIL import Image, ImageDraw, ImageFont
 
 from localization import BaseLocalization
@@ -67,21 +67,20 @@ class Resources(metaclass=Singleton):
         else:
             return Resources.COIN_LOGO.format(asset=asset_name_cut_chain(asset))
 
-    async def download_logo(self, asset):
-        async with aiohttp.ClientSession() as session:
-            url = self.image_url(asset)
-            logging.info(f'Downloading logo for {asset} from {url}...')
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    f = await aiofiles.open(self.LOCAL_COIN_LOGO.format(asset=asset), mode='wb')
-                    await f.write(await resp.read())
-                    await f.close()
-
-    async def download_logo_cached(self, asset):
+    async def download_logo(self, session: ClientSession, asset):
+        url = self.image_url(asset)
+        logging.info(f'Downloading logo for {asset} from {url}...')
+        async with session.get(url) as resp:
+            if resp.status == 200:
+                f = await aiofiles.open(self.LOCAL_COIN_LOGO.format(asset=asset), mode='wb')
+                await f.write(await resp.read())
+                await f.close()
+
+    async def download_logo_cached(self, session: ClientSession, asset):
         try:
             local_path = self.LOCAL_COIN_LOGO.format(asset=asset)
             if not os.path.exists(local_path):
-                await self.download_logo(asset)
+                await self.download_logo(session, asset)
             logo = Image.open(local_path).convert("RGBA")
         except:
             logo = Image.open(self.UNKNOWN_LOGO)
@@ -119,12 +118,13 @@ def is_stable_coin(pool):
     return pool == BUSD_SYMBOL
 
 
-async def lp_pool_picture(report: StakePoolReport, loc: BaseLocalization, value_hidden=False):
+async def lp_pool_picture(report: StakePoolReport, loc: BaseLocalization, session: ClientSession,
+                          value_hidden=False):
     r = Resources()
     asset = report.pool.asset
     rune_image, asset_image = await asyncio.gather(
-        r.download_logo_cached(RUNE_SYMBOL),
-        r.download_logo_cached(asset)
+        r.download_logo_cached(session, RUNE_SYMBOL),
+        r.download_logo_cached(session, asset)
     )
     return await sync_lp_pool_picture(report, loc, rune_image, asset_image, value_hidden)
 
@@ -96,7 +96,7 @@ class MetricsDialog(BaseDialog):
 
     @message_handler(state=MetricsStates.PRICE_SELECT_DURATION)
     async def on_price_duration_answered(self, message: Message):
-        fp = await fair_rune_price(self.deps.price_holder)
+        fp = await fair_rune_price(self.deps.price_holder, self.deps.session)
         pn = PriceNotifier(self.deps)
         price_1h, price_24h, price_7d = await pn.historical_get_triplet()
         fp.real_rune_price = self.deps.price_holder.usd_per_rune
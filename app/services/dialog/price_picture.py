@@ -7,6 +7,7 @@ from services.models.time_series import PriceTimeSeries, RUNE_SYMBOL, RUNE_SYMBO
 
 PRICE_GRAPH_WIDTH = 640
 PRICE_GRAPH_HEIGHT = 480
+PRICE_GRAPH_TARGET_POINTS = 300
 
 LINE_COLOR_REAL_PRICE = '#ffa600'
 LINE_COLOR_DET_PRICE = '#ff6361'
@@ -42,8 +43,8 @@ async def price_graph_from_db(db: DB, loc: BaseLocalization, period=DAY):
     series = PriceTimeSeries(RUNE_SYMBOL, db)
     det_series = PriceTimeSeries(RUNE_SYMBOL_DET, db)
 
-    prices = await series.get_last_values(period, with_ts=True)
-    det_prices = await det_series.get_last_values(period, with_ts=True)
+    prices = await series.get_last_values(period, with_ts=True, target_points=PRICE_GRAPH_TARGET_POINTS)
+    det_prices = await det_series.get_last_values(period, with_ts=True, target_points=PRICE_GRAPH_TARGET_POINTS)
 
     time_scale_mode = 'time' if period <= DAY else 'date'
 
@@ -4,16 +4,19 @@ from localization import BaseLocalization
 from services.lib.datetime import series_to_pandas, DAY
 from services.lib.depcont import DepContainer
 from services.lib.plot_graph import PlotBarGraph, img_to_bio
+from services.lib.rollup import DEFAULT_ROLLUPS
 from services.lib.utils import async_wrap
 from services.models.time_series import TimeSeries
 
 QUEUE_TIME_SERIES = 'thor_queue'
+QUEUE_GRAPH_TARGET_POINTS = 300
 RESAMPLE_TIME = '10min'
 
 
 async def queue_graph(d: DepContainer, loc: BaseLocalization, duration=DAY):
-    ts = TimeSeries(QUEUE_TIME_SERIES, d.db)
-    points = await ts.select(*ts.range_from_ago_to_now(duration, tolerance_sec=10), count=10000)
+    ts = TimeSeries(QUEUE_TIME_SERIES, d.db, rollups=DEFAULT_ROLLUPS)
+    points = await ts.get_last_points(duration, max_points=10000, tolerance_sec=10,
+                                      target_points=QUEUE_GRAPH_TARGET_POINTS)
     if not points:
         return None
     return await queue_graph_sync(points, loc)
@@ -153,7 +153,7 @@ class StakeDialog(BaseDialog):
         stake_report = await lpf.fetch_stake_report_for_pool(liq, ppf)
 
         value_hidden = not self.data.get(self.KEY_CAN_VIEW_VALUE, True)
-        picture = await lp_pool_picture(stake_report, self.loc, value_hidden=value_hidden)
+        picture = await lp_pool_picture(stake_report, self.loc, self.deps.session, value_hidden=value_hidden)
         picture_io = img_to_bio(picture, f'kylin_LP_{pool}.png')
 
         # ANSWER
@@ -1,7 +1,10 @@
 import asyncio
 import logging
 from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict
 
+from services.lib.datetime import parse_timespan_to_seconds
 from services.lib.depcont import DepContainer
 
 
@@ -13,6 +16,74 @@ class INotified(ABC):
         ...
 
 
+class DelegateQueue:
+    """
+    Bounded queue + worker task for one subscriber, so a slow notifier never holds up the fetch loop or its peers.
+    """
+
+    DROP_OLDEST = 'drop_oldest'  # queue is full: forget the oldest item
+    COALESCE = 'coalesce'  # only the latest data matters: new data replaces the pending data (not errors)
+
+    KIND_DATA = 'data'
+    KIND_ERROR = 'error'
+
+    def __init__(self, sender, delegate: INotified, max_size=10, policy=DROP_OLDEST):
+        assert max_size > 0
+        assert policy in (self.DROP_OLDEST, self.COALESCE)
+        self.sender = sender
+        self.delegate = delegate
+        self.max_size = max_size
+        self.policy = policy
+        self.dropped = 0
+        self._items = deque()
+        self._has_items = asyncio.Event()
+        self._task = None
+        self.logger = logging.getLogger(f'DelegateQueue.{delegate.__class__.__name__}')
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, kind, payload):
+        if self.policy == self.COALESCE and kind == self.KIND_DATA:
+            # only the latest data item waits; the ones it replaces are stale anyway. Errors are always delivered
+            n_before = len(self._items)
+            self._items = deque(item for item in self._items if item[0] != self.KIND_DATA)
+            self.dropped += n_before - len(self._items)
+        if len(self._items) >= self.max_size:
+            self.dropped += 1
+            self._items.popleft()
+            self.logger.warning(f'queue is full ({self.max_size}); dropped = {self.dropped}')
+        self._items.append((kind, payload))
+        self._has_items.set()
+
+    async def _handle(self, kind, payload):
+        if kind == self.KIND_DATA:
+            await self.delegate.on_data(self.sender, payload)
+        else:
+            await self.delegate.on_error(self.sender, payload)
+
+    async def _worker(self):
+        while True:
+            await self._has_items.wait()
+            while self._items:
+                kind, payload = self._items.popleft()
+                try:
+                    await self._handle(kind, payload)
+                except Exception as e:
+                    self.logger.exception(f"delegate error ({kind}): {e}")
+            self._has_items.clear()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
 class BaseFetcher(ABC):
     def __init__(self, deps: DepContainer, sleep_period=60):
         self.deps = deps
@@ -20,35 +91,92 @@ class BaseFetcher(ABC):
         self.sleep_period = sleep_period
         self.logger = logging.getLogger(f'{self.__class__.__name__}')
         self.delegates = set()
+        self.delegate_queues: Dict[INotified, DelegateQueue] = {}
+
+        # adaptive polling, off unless configured
+        self.adaptive = False
+        self.min_period = self.max_period = sleep_period
+        self.shrink_factor, self.grow_factor = 0.5, 1.5
+        self._last_data = None
+
+    def configure_adaptive(self, cfg):
+        """
+        Reads the optional "adaptive" subsection of the fetcher's config, e.g.:
+            adaptive:
+              min_period: 20s
+              max_period: 10m
+              shrink: 0.5
+              grow: 1.5
+        """
+        acfg = cfg.get('adaptive') if cfg else None
+        if not acfg:
+            return
+        self.adaptive = True
+        self.min_period = parse_timespan_to_seconds(str(acfg.get('min_period', self.sleep_period)))
+        self.max_period = parse_timespan_to_seconds(str(acfg.get('max_period', self.sleep_period)))
+        self.shrink_factor = float(acfg.get('shrink', self.shrink_factor))
+        self.grow_factor = float(acfg.get('grow', self.grow_factor))
+        assert 0 < self.min_period <= self.max_period
+        assert 0 < self.shrink_factor <= 1.0 <= self.grow_factor
+        self.logger.info(f'adaptive polling: {self.min_period}..{self.max_period} sec')
+
+    def is_significant_change(self, old_data, new_data) -> bool:  # override for a smarter comparison
+        return old_data != new_data
 
-    def subscribe(self, delegate: INotified):
+    def adapt_period(self, data):
+        if not self.adaptive or not data:
+            return
+        if self._last_data is not None:
+            if self.is_significant_change(self._last_data, data):
+                new_period = max(self.min_period, self.sleep_period * self.shrink_factor)
+            else:
+                new_period = min(self.max_period, self.sleep_period * self.grow_factor)
+            if new_period != self.sleep_period:
+                self.logger.info(f'polling period: {self.sleep_period:.0f} -> {new_period:.0f} sec')
+                self.sleep_period = new_period
+        self._last_data = data
+
+    def subscribe(self, delegate: INotified, max_queue=10, policy=DelegateQueue.DROP_OLDEST):
         self.delegates.add(delegate)
+        self.delegate_queues[delegate] = DelegateQueue(self, delegate, max_queue, policy)
         return self
 
+    @property
+    def queue_depths(self):
+        return {f'{d.__class__.__name__}#{id(d):x}': q.depth for d, q in self.delegate_queues.items()}
+
     @abstractmethod
     async def fetch(self):
         ...
 
+    def _dispatch(self, kind, payload):
+        for q in self.delegate_queues.values():
+            q.start()
+            q.put(kind, payload)
+
     async def handle_error(self, e):
-        for delegate in self.delegates:
-            await delegate.on_error(self, e)
+        self._dispatch(DelegateQueue.KIND_ERROR, e)
 
-    async def run(self):
-        await asyncio.sleep(1)
-        while True:
-            try:
-                data = await self.fetch()
-                if data:
-                    for delegate in self.delegates:
-                        delegate: INotified
-                        await delegate.on_data(self, data)
+    async def handle_data(self, data):
+        self._dispatch(DelegateQueue.KIND_DATA, data)
 
-            except Exception as e:
-                self.logger.exception(f"task error: {e}")
+    async def run_once(self):
+        try:
+            data = await self.fetch()
+            self.adapt_period(data)
+            if data:
+                await self.handle_data(data)
 
-                try:
-                    await self.handle_error(e)
-                except Exception as e:
-                    self.logger.exception(f"task error while handling on_error: {e}")
+        except Exception as e:
+            self.logger.exception(f"task error: {e}")
+
+            try:
+                await self.handle_error(e)
+            except Exception as e:
+                self.logger.exception(f"task error while handling on_error: {e}")
 
+    async def run(self):
+        await asyncio.sleep(1)
+        while True:
+            await self.run_once()
             await asyncio.sleep(self.sleep_period)
@@ -14,6 +14,10 @@ class CapInfoFetcher(BaseFetcher):
         self.ppf = ppf
         sleep_period = parse_timespan_to_seconds(deps.cfg.cap.fetch_period)
         super().__init__(deps, sleep_period)
+        self.configure_adaptive(deps.cfg.cap)
+
+    def is_significant_change(self, old_data: ThorInfo, new_data: ThorInfo) -> bool:
+        return (old_data.cap, old_data.stacked) != (new_data.cap, new_data.stacked)
 
     async def fetch(self) -> ThorInfo:
         self.logger.info("start fetching caps and mimir")
@@ -1,8 +1,6 @@
 import logging
 
-import aiohttp
-from aioredis import ReplyError
-from tqdm import tqdm
+from aiohttp import ClientSession
 
 from services.models.time_series import PriceTimeSeries, RUNE_SYMBOL, RUNE_SYMBOL_DET
 
@@ -11,17 +9,16 @@ COIN_RANK_GECKO = "https://api.coingecko.com/api/v3/coins/kylin?" \
                   "tickers=false&market_data=false&community_data=false&developer_data=false"
 
 
-async def get_rune_chart(days):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(COIN_CHART_GECKO.format(days=days)) as resp:
-            j = await resp.json()
-            return j['prices']
+async def get_rune_chart(session: ClientSession, days):
+    async with session.get(COIN_CHART_GECKO.format(days=days)) as resp:
+        j = await resp.json()
+        return j['prices']
 
 
-async def fill_rune_price_from_gecko(db, include_fake_det=False, fake_value=0.2):
+async def fill_rune_price_from_gecko(db, session: ClientSession, include_fake_det=False, fake_value=0.2):
     logging.warning('fill_rune_price_from_gecko is called!')
-    gecko_data8 = await get_rune_chart(8)
-    gecko_data1 = await get_rune_chart(1)
+    gecko_data8 = await get_rune_chart(session, 8)
+    gecko_data1 = await get_rune_chart(session, 1)
 
     price_chart = gecko_data8 + gecko_data1
     price_chart.sort(key=lambda p: p[0])
@@ -33,14 +30,9 @@ async def fill_rune_price_from_gecko(db, include_fake_det=False, fake_value=0.2)
     if include_fake_det:
         await det_series.clear()
 
-    for ts, price in tqdm(price_chart):
-        ident = f'{ts}-0'
-        try:
-            await series.add(message_id=ident, price=price)
-            if include_fake_det:
-                await det_series.add(message_id=ident, price=fake_value)
-        except ReplyError:
-            pass
+    await series.add_many((f'{ts}-0', {'price': price}) for ts, price in price_chart)
+    if include_fake_det:
+        await det_series.add_many((f'{ts}-0', {'price': fake_value}) for ts, _ in price_chart)
 
 
 async def gecko_info(session):
@@ -1,23 +1,27 @@
+import asyncio
 import logging
 import random
 from typing import List
 
+from services.fetch.node_score import NodeScoreBoard
+
 
 class ThorNodeAddressManager:
     @staticmethod
     def connection_url(ip_address, path=''):
         return f'http://{ip_address}:1317{path}'
 
-    def __init__(self, seed, session=None, reload_each_n_request=100):
+    def __init__(self, seed, session=None, refresh_period=600):
         assert seed
         self.logger = logging.getLogger('ThorNodeAddressManager')
         self.nodes_ip = []
         self.seed_url = seed
-        self._cnt = 0
-        self._black_list = set()
-        self.reload_each_n_request = reload_each_n_request
+        self.scores = NodeScoreBoard()
+        self.refresh_period = refresh_period
         self.session = session
         self._rng = random.SystemRandom()
+        self._reload_lock = asyncio.Lock()
+        self._refresher_task = None
 
     async def get_seed_nodes(self):
         assert self.session
@@ -43,48 +47,77 @@ class ThorNodeAddressManager:
             self.logger.info(f'total nodes loaded: {len(json)}; active: {len(nodes)} ')
             return nodes
 
-    async def reload_nodes_ip(self):
+    async def _discover_active_list(self):
         seed_nodes_ip = await self.get_seed_nodes()
         self._rng.shuffle(seed_nodes_ip)
         for node_ip in seed_nodes_ip:
             try:
                 active_list = await self.get_thornode_active_list(node_ip)
-                if not active_list:
-                    raise ValueError('empty')
-                else:
-                    self.nodes_ip = active_list
-                    break
+                if len(active_list) > 1:
+                    return active_list
+                raise ValueError(f'too few nodes ({len(active_list)})')
             except Exception as e:
                 self.logger.error(f'failed to get active list from {node_ip}: {e}; next!')
+        return []
+
+    async def reload_nodes_ip(self):
+        """
+        Rebuilds the active node list and swaps it in at once.
+        If discovery fails, the last good list stays in use.
+        :return: True if the list was updated
+        """
+        async with self._reload_lock:
+            try:
+                active_list = await self._discover_active_list()
+            except Exception as e:
+                self.logger.error(f'node discovery failed: {e}')
+                active_list = []
+
+            if not active_list:
+                self.logger.error(f'keeping the last good node list ({len(self.nodes_ip)} nodes)')
+                return False
 
-        assert self.nodes_ip
+            self.nodes_ip = active_list
+            self.logger.info(f'active nodes loaded: ({len(self.nodes_ip)}) {self.nodes_ip})')
+            return True
 
-        self.logger.info(f'active nodes loaded: ({len(self.nodes_ip)}) {self.nodes_ip})')
-        assert len(self.nodes_ip) > 1
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_period)
+            try:
+                await self.reload_nodes_ip()
+            except Exception as e:
+                self.logger.exception(f'node list refresh error: {e}')
+
+    def start_refresher(self):
+        if self._refresher_task is None or self._refresher_task.done():
+            self._refresher_task = asyncio.create_task(self._refresh_loop())
+        return self._refresher_task
 
     @property
     def valid_nodes(self):
-        return set(self.nodes_ip) - self._black_list
+        return set(self.scores.healthy(self.nodes_ip))
 
     async def select_node(self):
         return (await self.select_nodes(n=1))[0]
 
     async def select_nodes(self, n) -> List[str]:
-        nodes = self.valid_nodes
-
-        if not nodes or not self.nodes_ip or self._cnt >= self.reload_each_n_request:
-            self._cnt = 0
+        if not self.nodes_ip:
+            # cold start only; afterwards the list is refreshed in the background
             await self.reload_nodes_ip()
-            nodes = self.valid_nodes
-        else:
-            self._cnt += 1
+            if not self.nodes_ip:
+                raise LookupError('no THORNodes available')
+
+        nodes = self.valid_nodes
+        if len(nodes) < n:
+            self.logger.warning(f'only {len(nodes)} healthy nodes for a cohort of {n}; using penalized ones too')
+            nodes = set(self.nodes_ip)
 
-        ips = self._rng.sample(list(nodes), n)
+        ips = self.scores.weighted_sample(nodes, n, self._rng)
         return ips
 
     async def select_node_url(self):
         return self.connection_url(await self.select_node())
 
     async def blacklist_node(self, ip, reason='?'):
-        self.logger.warning(f'blacklisting {ip} reason: {reason}.')
-        self._black_list.add(ip)
+        self.scores.penalize(ip, reason)
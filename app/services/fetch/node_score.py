@@ -0,0 +1,110 @@
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+
+@dataclass
+class NodeScore:
+    latency: float = -1.0  # EWMA of response time, sec; < 0 = unknown
+    error_rate: float = 0.0  # EWMA 0..1
+    disagree_rate: float = 0.0  # EWMA 0..1
+    n_samples: int = 0
+    penalized_until: float = 0.0
+
+    def is_penalized(self, now):
+        return now < self.penalized_until
+
+
+class NodeScoreBoard:
+    def __init__(self, alpha=0.2, default_latency=1.0, penalty_sec=600,
+                 max_error_rate=0.5, max_disagree_rate=0.34, min_samples=5):
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self.penalty_sec = penalty_sec
+        self.max_error_rate = max_error_rate
+        self.max_disagree_rate = max_disagree_rate
+        self.min_samples = min_samples
+        self.scores: Dict[str, NodeScore] = {}
+        self.logger = logging.getLogger('NodeScoreBoard')
+
+    def _ewma(self, old, sample):
+        return old + self.alpha * (sample - old)
+
+    def get(self, ip) -> NodeScore:
+        score = self.scores.get(ip)
+        if score is None:
+            score = self.scores[ip] = NodeScore()
+        return score
+
+    def report_latency(self, ip, latency):
+        score = self.get(ip)
+        score.latency = latency if score.latency < 0 else self._ewma(score.latency, latency)
+
+    def report_censored_latency(self, ip, elapsed, penalty_latency):
+        """
+        The request was abandoned after "elapsed" sec (e.g. cancelled by the early quorum): the real latency
+        is unknown but not less. It is charged as "penalty_latency" (e.g. the timeout), so the estimate only grows
+        """
+        score = self.get(ip)
+        sample = max(elapsed, penalty_latency, score.latency)
+        score.latency = sample if score.latency < 0 else self._ewma(score.latency, sample)
+
+    def report_success(self, ip, latency):
+        score = self.get(ip)
+        self.report_latency(ip, latency)
+        score.error_rate = self._ewma(score.error_rate, 0.0)
+        score.n_samples += 1
+
+    def report_error(self, ip, latency=None):
+        score = self.get(ip)
+        if latency is not None:
+            self.report_latency(ip, latency)
+        score.error_rate = self._ewma(score.error_rate, 1.0)
+        score.n_samples += 1
+        if score.n_samples >= self.min_samples and score.error_rate > self.max_error_rate:
+            self.penalize(ip, f'error rate {score.error_rate:.2f}')
+
+    def report_consensus(self, ip, agreed: bool):
+        score = self.get(ip)
+        score.disagree_rate = self._ewma(score.disagree_rate, 0.0 if agreed else 1.0)
+        if score.n_samples >= self.min_samples and score.disagree_rate > self.max_disagree_rate:
+            self.penalize(ip, f'disagree rate {score.disagree_rate:.2f}')
+
+    def penalize(self, ip, reason='?', period=None):
+        score = self.get(ip)
+        period = self.penalty_sec if period is None else period
+        score.penalized_until = time.time() + period
+        # give it a fresh chance once the penalty is over
+        score.error_rate *= 0.5
+        score.disagree_rate *= 0.5
+        score.n_samples = 0
+        self.logger.warning(f'penalizing {ip} for {period} sec. reason: {reason}.')
+
+    def is_penalized(self, ip, now=None):
+        score = self.scores.get(ip)
+        return score is not None and score.is_penalized(now or time.time())
+
+    def healthy(self, ips: Iterable[str], now=None) -> List[str]:
+        now = now or time.time()
+        return [ip for ip in ips if not self.is_penalized(ip, now)]
+
+    def weight(self, ip):
+        score = self.scores.get(ip)
+        if score is None:
+            return 1.0 / self.default_latency
+        latency = score.latency if score.latency > 0 else self.default_latency
+        health = (1.0 - score.error_rate) * (1.0 - score.disagree_rate)
+        return max(health, 0.01) / max(latency, 0.01)
+
+    def weighted_sample(self, ips: Iterable[str], n, rng: random.Random = None) -> List[str]:
+        """
+        Weighted random sampling without replacement (Efraimidis-Spirakis)
+        """
+        rng = rng or random
+        keyed = [(rng.random() ** (1.0 / self.weight(ip)), ip) for ip in ips]
+        if n > len(keyed):
+            raise ValueError(f'sample larger than population ({n} > {len(keyed)})')
+        keyed.sort(reverse=True)
+        return [ip for _, ip in keyed[:n]]
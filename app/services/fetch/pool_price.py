@@ -2,7 +2,9 @@ from services.fetch.base import BaseFetcher
 from services.fetch.fair_price import fair_rune_price
 from services.lib.datetime import parse_timespan_to_seconds, DAY, HOUR
 from services.lib.depcont import DepContainer
+from services.lib.money import calc_percent_change
 from services.models.pool_info import PoolInfo
+from services.models.price import RuneFairPrice
 from services.models.time_series import PriceTimeSeries, BUSD_SYMBOL, RUNE_SYMBOL, RUNE_SYMBOL_DET, TimeSeries
 
 MIDGARD_AGGREGATED_POOL_INFO = \
@@ -16,6 +18,8 @@ class PoolPriceFetcher(BaseFetcher):
         super().__init__(deps, sleep_period=period)
         self.deps = deps
         self.pool_series = TimeSeries('pool-info', self.deps.db)
+        self.configure_adaptive(cfg.price)
+        self.price_band_percent = float((cfg.price.get('adaptive') or {}).get('band', 0.5))
 
     @staticmethod
     def historic_url(asset, height):
@@ -39,19 +43,23 @@ class PoolPriceFetcher(BaseFetcher):
             await pts.add(price=price)
 
             pts_det = PriceTimeSeries(RUNE_SYMBOL_DET, d.db)
-            fair_price = await fair_rune_price(d.price_holder)
+            fair_price = await fair_rune_price(d.price_holder, d.session)
             await pts_det.add(price=fair_price.fair_price)
             fair_price.real_rune_price = price
             return fair_price
         else:
             self.logger.warning(f'really ${price:.3f}? that is odd!')
 
+    def is_significant_change(self, old_data: RuneFairPrice, new_data: RuneFairPrice) -> bool:
+        change = calc_percent_change(old_data.real_rune_price, new_data.real_rune_price)
+        return abs(change) >= self.price_band_percent
+
     async def fetch_pool_data_historic(self, asset, height=0) -> PoolInfo:
         if asset == RUNE_SYMBOL:
             return PoolInfo.dummy()
 
         url = self.historic_url(asset, height)
-        pool_info_raw = await self.deps.thor_nodes.request(url)
+        pool_info_raw = await self.deps.thor_nodes.request(url, pinned_height=height)
         return PoolInfo.from_dict(pool_info_raw)
 
     async def get_price_in_rune(self, asset, height=0):
@@ -1,5 +1,3 @@
-import aiohttp
-
 from services.fetch.base import BaseFetcher
 from services.lib.datetime import parse_timespan_to_seconds
 from services.lib.depcont import DepContainer
@@ -12,16 +10,16 @@ class QueueFetcher(BaseFetcher):
     def __init__(self, deps: DepContainer):
         period = parse_timespan_to_seconds(deps.cfg.queue.fetch_period)
         super().__init__(deps, period)
+        self.configure_adaptive(deps.cfg.queue)
 
     async def fetch(self) -> QueueInfo:  # override
-        async with aiohttp.ClientSession() as session:
-            # return QueueInfo(0, 1)  # debug
+        # return QueueInfo(0, 1)  # debug
 
-            resp = await self.deps.thor_nodes.request(self.QUEUE_PATH)
-            if resp is None:
-                return QueueInfo.error()
+        resp = await self.deps.thor_nodes.request(self.QUEUE_PATH)
+        if resp is None:
+            return QueueInfo.error()
 
-            swap_queue = int(resp.get('swap', 0))
-            outbound_queue = int(resp.get('outbound', 0))
+        swap_queue = int(resp.get('swap', 0))
+        outbound_queue = int(resp.get('outbound', 0))
 
-            return QueueInfo(swap_queue, outbound_queue)
+        return QueueInfo(swap_queue, outbound_queue)
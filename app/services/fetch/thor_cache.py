@@ -0,0 +1,70 @@
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from services.lib.datetime import DAY
+from services.lib.db import DB
+
+
+class ImmutableResponseCache:
+    """
+    Cache for THORNode responses pinned to a past block height: they never change once consensus is reached.
+    Memory LRU in front, optional Redis tier behind (pass db=None to disable it).
+    """
+
+    KEY_PREFIX = 'thor_imm'
+
+    def __init__(self, db: Optional[DB] = None, max_size=2000, redis_ttl=30 * DAY):
+        self.db = db
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self._mem = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger('ImmutableResponseCache')
+
+    @classmethod
+    def key(cls, path, height):
+        return f'{cls.KEY_PREFIX}:{height}:{path}'
+
+    def _mem_put(self, key, text):
+        self._mem[key] = text
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_size:
+            self._mem.popitem(last=False)
+
+    async def get(self, path, height) -> Optional[str]:
+        key = self.key(path, height)
+        text = self._mem.get(key)
+        if text is not None:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return text
+
+        if self.db is not None:
+            try:
+                r = await self.db.get_redis()
+                raw = await r.get(key)
+                if raw is not None:
+                    text = raw.decode()
+                    self._mem_put(key, text)
+                    self.hits += 1
+                    return text
+            except Exception as e:
+                self.logger.warning(f'redis tier read failed for "{key}": {e}')
+
+        self.misses += 1
+        return None
+
+    async def put(self, path, height, text: str):
+        key = self.key(path, height)
+        self._mem_put(key, text)
+        if self.db is not None:
+            try:
+                r = await self.db.get_redis()
+                await r.set(key, text, expire=self.redis_ttl)
+            except Exception as e:
+                self.logger.warning(f'redis tier write failed for "{key}": {e}')
+
+    def clear_memory(self):
+        self._mem.clear()
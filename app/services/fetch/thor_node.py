@@ -1,38 +1,66 @@
 import asyncio
 import logging
+import time
 from collections import Counter
 from hashlib import sha256
+from typing import Dict
 
 import ujson
 from aiohttp import ClientSession, ClientConnectorError
 
 from services.fetch.node_ip_manager import ThorNodeAddressManager
+from services.fetch.thor_cache import ImmutableResponseCache
 
 
 class ThorNode:
-    def __init__(self, node_ip_man: ThorNodeAddressManager, session: ClientSession, cohort_size=5, consensus=3):
+    def __init__(self, node_ip_man: ThorNodeAddressManager, session: ClientSession, cohort_size=5, consensus=3,
+                 early_quorum=True, cache: ImmutableResponseCache = None):
         self.node_ip_man = node_ip_man
         self.session = session
 
         self.cohort_size = cohort_size
         self.consensus = consensus
+        self.early_quorum = early_quorum  # return as soon as "consensus" identical responses are in
+        self.cache = cache  # for responses pinned to a past height
         assert consensus > 0
         assert cohort_size >= consensus
 
         self.timeout = 3.0
         self.logger = logging.getLogger('ThorNode')
+        self._in_flight: Dict[str, asyncio.Future] = {}  # path -> consensus round shared by concurrent callers
 
     async def _request_one_node_as_text(self, node_ip, path):
         url = self.node_ip_man.connection_url(node_ip, path)
+        scores = self.node_ip_man.scores
+        t0 = time.monotonic()
         try:
             async with self.session.get(url, timeout=self.timeout) as resp:
-                return await resp.text()
+                text = await resp.text()
+                if resp.status == 200:
+                    scores.report_success(node_ip, time.monotonic() - t0)
+                else:
+                    scores.report_error(node_ip, time.monotonic() - t0)
+                return text
         except (ClientConnectorError, asyncio.TimeoutError) as e:
+            scores.report_error(node_ip, time.monotonic() - t0)
             self.logger.warning(f'Cannot connect to THORNode ({node_ip}) for "{path}" (err: {e}).')
             return ''
+        except asyncio.CancelledError:
+            # cancelled by the early quorum: a lower bound only, charged as a timeout
+            scores.report_censored_latency(node_ip, time.monotonic() - t0, self.timeout)
+            raise
+
+    @staticmethod
+    def _response_hash(text):
+        return sha256(text.encode('utf-8')).hexdigest()
+
+    def _report_consensus(self, hash_by_ip: dict, best_hash):
+        for ip, this_hash in hash_by_ip.items():
+            if this_hash is not None:
+                self.node_ip_man.scores.report_consensus(ip, agreed=(this_hash == best_hash))
 
     def _consensus_response(self, text_responses):
-        hash_dict = {i: sha256(r.encode('utf-8')).hexdigest() for i, r in enumerate(text_responses)}
+        hash_dict = {i: self._response_hash(r) for i, r in enumerate(text_responses)}
         counter = Counter(hash_dict.values())
         most_hash, most_freq = counter.most_common(1)[0]
         if most_freq >= self.consensus > 0:
@@ -41,23 +69,89 @@ class ThorNode:
         else:
             return None, 0.0
 
+    async def _quorum_response(self, node_ips, path):
+        tasks = {asyncio.create_task(self._request_one_node_as_text(ip, path)): ip for ip in node_ips}
+        pending = set(tasks.keys())
+        counter = Counter()
+        hash_by_ip = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    text = task.result()
+                    if not text:
+                        continue
+                    this_hash = hash_by_ip[tasks[task]] = self._response_hash(text)
+                    counter[this_hash] += 1
+                    if counter[this_hash] >= self.consensus:
+                        self._report_consensus(hash_by_ip, this_hash)
+                        return text, counter[this_hash] / self.cohort_size
+            return None, 0.0
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _gather_response(self, node_ips, path):
+        text_responses = await asyncio.gather(*[self._request_one_node_as_text(ip, path) for ip in node_ips])
+        best_text_response, ratio = self._consensus_response(text_responses)
+        if best_text_response is not None:
+            self._report_consensus({
+                ip: self._response_hash(text) for ip, text in zip(node_ips, text_responses) if text
+            }, self._response_hash(best_text_response))
+        return best_text_response, ratio
+
     async def request_random_node(self, path: str):
         node_id = await self.node_ip_man.select_node()
         text = await self._request_one_node_as_text(node_id, path)
         return ujson.loads(text)
 
-    async def request(self, path: str):
-        if not path.startswith('/'):
-            path = '/' + path
+    async def _consensus_round(self, path):
         node_ips = await self.node_ip_man.select_nodes(self.cohort_size)
         # node_ips[0] = '127.0.0.1'  # debug
 
         self.logger.info(f'Start request to Thor node "{path}"')
-        text_responses = await asyncio.gather(*[self._request_one_node_as_text(ip, path) for ip in node_ips])
-        best_text_response, ratio = self._consensus_response(text_responses)
+        if self.early_quorum:
+            best_text_response, ratio = await self._quorum_response(node_ips, path)
+        else:
+            best_text_response, ratio = await self._gather_response(node_ips, path)
         if best_text_response is None:
             self.logger.error(f'No consensus reached between nodes: {node_ips} for request "{path}"!')
-            return None
         else:
             self.logger.info(f'Success for the request "{path}" consensus: {(ratio * 100.0):.0f}%')
-            return ujson.loads(best_text_response)
+        return best_text_response
+
+    async def _request_single_flight(self, path):
+        flight = self._in_flight.get(path)
+        if flight is None:
+            flight = asyncio.ensure_future(self._consensus_round(path))
+            self._in_flight[path] = flight
+            flight.add_done_callback(lambda _: self._in_flight.pop(path, None))
+        else:
+            self.logger.debug(f'Joining the in-flight request "{path}"')
+        # shield: one caller being cancelled must not cancel the round for the others
+        return await asyncio.shield(flight)
+
+    async def request(self, path: str, pinned_height=0):
+        """
+        :param path: THORNode API path
+        :param pinned_height: block height the path is pinned to (e.g. "?height=N"); such responses are cached
+        :return: parsed JSON or None if there is no consensus
+        """
+        if not path.startswith('/'):
+            path = '/' + path
+
+        use_cache = pinned_height > 0 and self.cache is not None
+        if use_cache:
+            text = await self.cache.get(path, pinned_height)
+            if text is not None:
+                return ujson.loads(text)
+
+        text = await self._request_single_flight(path)
+        if text is None:
+            return None
+
+        # every caller gets its own parsed copy
+        result = ujson.loads(text)
+        if use_cache and not (isinstance(result, dict) and 'error' in result):
+            await self.cache.put(path, pinned_height, text)
+        return result
@@ -1,30 +1,40 @@
 import asyncio
-from typing import List
+import time
+from collections import OrderedDict
+from typing import List, Optional
 
 from services.fetch.base import BaseFetcher
 from services.lib.datetime import parse_timespan_to_seconds
 from services.lib.depcont import DepContainer
 from services.models.pool_info import PoolInfo
 from services.models.time_series import BUSD_SYMBOL
-from services.models.tx import StakeTx, StakePoolStats
+from services.models.tx import StakeTx, StakePoolStats, TxWatermark
 
 TRANSACTION_URL = "https://chaosnet-midgard.bepswap.com/v1/txs?offset={offset}&limit={limit}&type=stake,unstake"
 
 
 class StakeTxFetcher(BaseFetcher):
     MAX_PAGE_DEEP = 10
+    MAX_RECENT_HASHES = 2000
 
     def __init__(self, deps: DepContainer):
         super().__init__(deps, sleep_period=60)
 
         self.pool_stat_map = {}
         self.pool_info_map = {}
+        self._recent_notified = OrderedDict()  # tx hash -> None; in-process front of the Redis check
 
         scfg = deps.cfg.tx.stake_unstake
 
         self.sleep_period = parse_timespan_to_seconds(scfg.fetch_period)
         self.tx_per_batch = int(scfg.tx_per_batch)
         self.max_page_deep = int(scfg.max_page_deep)
+        self.prefetch_pages = max(1, int(scfg.get('prefetch_pages', 3)))  # fetched concurrently after page 0
+        self._next_watermark: Optional[TxWatermark] = None
+        # older txs are never notified, so their dedup markers can go
+        self.dedup_horizon_sec = parse_timespan_to_seconds(scfg.max_age_sec)
+        # by then every legacy "tx_not:*" marker still in use has been migrated (see StakeTx.which_notified)
+        self._legacy_cleanup_at = time.time() + self.dedup_horizon_sec
 
         self.logger.info(f"cfg.tx.stake_unstake: {scfg}")
 
@@ -33,6 +43,8 @@ class StakeTxFetcher(BaseFetcher):
 
         txs = await self._fetch_txs()
         if not txs:
+            await self._advance_watermark()
+            await self._drop_legacy_markers()
             return []
 
         await self._load_stats(txs)
@@ -40,6 +52,8 @@ class StakeTxFetcher(BaseFetcher):
         txs = await self._update_pools(txs)
         if txs:
             await self._mark_as_notified(txs)
+        await self._advance_watermark()
+        await self._drop_legacy_markers()
         return txs
 
     # -------
@@ -62,28 +76,77 @@ class StakeTxFetcher(BaseFetcher):
             txs = self._parse_txs(json)
             return list(txs)
 
-    async def _filter_new(self, txs):
-        new_txs = []
-        for tx in txs:
-            tx: StakeTx
-            if not (await tx.is_notified(self.deps.db)):
-                new_txs.append(tx)
+    def _remember_notified(self, hashes):
+        for tx_hash in hashes:
+            self._recent_notified[tx_hash] = None
+            self._recent_notified.move_to_end(tx_hash)
+        while len(self._recent_notified) > self.MAX_RECENT_HASHES:
+            self._recent_notified.popitem(last=False)
+
+    async def _filter_new(self, txs: List[StakeTx]):
+        min_date = time.time() - self.dedup_horizon_sec
+        unknown_txs = [tx for tx in txs if tx.hash not in self._recent_notified and tx.date >= min_date]
+        notified_flags = await StakeTx.which_notified(self.deps.db, unknown_txs)
+
+        new_txs = [tx for tx, notified in zip(unknown_txs, notified_flags) if not notified]
+        self._remember_notified(tx.hash for tx, notified in zip(unknown_txs, notified_flags) if notified)
         return new_txs
 
+    def _cut_at_watermark(self, txs: List[StakeTx], watermark: Optional[TxWatermark], min_date):
+        """
+        :return: txs above the watermark (and the age horizon); True if the rest of the feed is older
+        """
+        for i, tx in enumerate(txs):
+            if (watermark and watermark.is_reached_by(tx)) or tx.date < min_date:
+                return txs[:i], True
+        return txs, False
+
     async def _fetch_txs(self):
+        watermark = await TxWatermark.load(self.deps.db)
+        min_date = time.time() - self.dedup_horizon_sec
+        self._next_watermark = None
+
         all_txs = []
         page = 0
-        while page < self.max_page_deep:
-            txs = await self._fetch_one_batch(self.deps.session, page)
-            txs = await self._filter_new(txs)
-            if not txs:
-                self.logger.info(f"no more tx: got {len(all_txs)}")
-                break
+        reached_end = False
+        while page < self.max_page_deep and not reached_end:
+            # page 0 alone: usually it already reaches the watermark; only then the deeper pages are prefetched
+            n_pages = self.prefetch_pages if page > 0 else 1
+            pages = range(page, min(page + n_pages, self.max_page_deep))
+            batches = await asyncio.gather(*[self._fetch_one_batch(self.deps.session, p) for p in pages])
+            page += len(pages)
+
+            for txs in batches:  # in the feed order, newest first
+                if not txs:
+                    reached_end = True
+                    break
+
+                if self._next_watermark is None:
+                    self._next_watermark = TxWatermark(txs[0].date, txs[0].hash)
+
+                txs, reached_end = self._cut_at_watermark(txs, watermark, min_date)
+                new_txs = await self._filter_new(txs)
+                all_txs += new_txs
+
+                if watermark is None and not new_txs:
+                    reached_end = True  # no watermark yet: the first page without new txs is the end
+                if reached_end:
+                    break
+
+        all_txs = list({tx.hash: tx for tx in all_txs}.values())  # the feed may shift between concurrent pages
+        self.logger.info(f"no more tx: got {len(all_txs)}; pages: {page}")
+        return all_txs
 
-            all_txs += txs
-            page += 1
+    async def _drop_legacy_markers(self):
+        if self._legacy_cleanup_at is not None and time.time() >= self._legacy_cleanup_at:
+            self._legacy_cleanup_at = None
+            await StakeTx.clear_legacy_markers(self.deps.db)
+            self.logger.info('legacy tx markers are removed')
 
-        return all_txs
+    async def _advance_watermark(self):
+        if self._next_watermark is not None:
+            await self._next_watermark.save(self.deps.db)
+            self._next_watermark = None
 
     async def _update_pools(self, txs):
         updated_stats = set()
@@ -105,8 +168,7 @@ class StakeTxFetcher(BaseFetcher):
             pool_stat: StakePoolStats = self.pool_stat_map[pool_name]
             pool_info: PoolInfo = self.pool_info_map.get(pool_name)
             pool_stat.usd_depth = pool_info.usd_depth(self.deps.price_holder.usd_per_rune)
-            await pool_stat.write_time_series(self.deps.db)
-            await pool_stat.save(self.deps.db)
+        await StakePoolStats.save_many(self.deps.db, [self.pool_stat_map[p] for p in updated_stats])
 
         self.logger.info(f'new tx to analyze: {len(result_txs)}')
 
@@ -119,11 +181,9 @@ class StakeTxFetcher(BaseFetcher):
 
         pool_names = StakeTx.collect_pools(txs)
         pool_names.add(BUSD_SYMBOL)  # don't forget BUSD, for total usd volume!
-        self.pool_stat_map = {
-            pool: (await StakePoolStats.get_from_db(pool, self.deps.db)) for pool in pool_names
-        }
+        self.pool_stat_map = await StakePoolStats.get_many_from_db(pool_names, self.deps.db)
 
     async def _mark_as_notified(self, txs: List[StakeTx]):
-        await asyncio.gather(*[
-            tx.set_notified(self.deps.db) for tx in txs
-        ])
+        await StakeTx.mark_notified(self.deps.db, txs)
+        self._remember_notified(tx.hash for tx in txs)
+        await StakeTx.prune_notified(self.deps.db, self.dedup_horizon_sec)
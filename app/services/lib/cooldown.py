@@ -1,8 +1,52 @@
 import json
 from dataclasses import dataclass
 from time import time
+from typing import Dict
 
 from services.lib.db import DB
+from services.lib.lua_script import LuaScript
+from services.lib.state_cache import FLOAT
+
+# KEYS = cd_evt keys; ARGV[1] = now; ARGV[i + 1] = cooldown of KEYS[i]
+# every key that is off cooldown gets "now" -> {1 (acquired) or 0, ...}
+TRY_ACQUIRE_SINGLE_SCRIPT = LuaScript("""
+local now = tonumber(ARGV[1])
+local result = {}
+for i, key in ipairs(KEYS) do
+    local last = tonumber(redis.call('GET', key) or '0') or 0
+    if now - tonumber(ARGV[i + 1]) > last then
+        redis.call('SET', key, ARGV[1])
+        result[i] = 1
+    else
+        result[i] = 0
+    end
+end
+return result
+""")
+
+# KEYS[1] = cooldown key (JSON of CooldownRecord); ARGV = now, cooldown, max_times -> 1 (acquired) or 0
+TRY_ACQUIRE_RECORD_SCRIPT = LuaScript("""
+local now, cooldown, max_times = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t, count = 0, 0
+local raw = redis.call('GET', KEYS[1])
+if raw then
+    local ok, rec = pcall(cjson.decode, raw)
+    if ok and type(rec) == 'table' then
+        t = tonumber(rec['time']) or 0
+        count = tonumber(rec['count']) or 0
+    end
+end
+if now - cooldown <= t then
+    return 0
+end
+count = count + 1
+if count >= max_times then
+    t = now
+    count = 0
+end
+redis.call('SET', KEYS[1], cjson.encode({time = t, count = count}))
+return 1
+""")
 
 
 class CooldownSingle:
@@ -14,17 +58,45 @@ class CooldownSingle:
         return f"cd_evt:{name}"
 
     async def can_do(self, event_name, cooldown):
-        last_time = await self.db.redis.get(self.get_key(event_name))
+        last_time = await self.db.state.get(self.get_key(event_name), FLOAT)
         if last_time is None:
             return True
-        last_time = float(last_time)
         return time() - cooldown > last_time
 
     async def do(self, event_name):
-        await self.db.redis.set(self.get_key(event_name), time())
+        self.db.state.set(self.get_key(event_name), time(), FLOAT)
+
+    async def try_acquire(self, event_name, cooldown) -> bool:
+        """
+        can_do + do in one atomic call: no other bot instance can pass the check in between
+        """
+        results = await self.try_acquire_many({event_name: cooldown})
+        return results[event_name]
+
+    async def try_acquire_many(self, cooldowns: Dict[str, float]) -> Dict[str, bool]:
+        """
+        try_acquire for several events (event_name -> cooldown) in one request; each one is acquired independently
+        """
+        names = list(cooldowns.keys())
+        keys = [self.get_key(name) for name in names]
+        now = time()
+        state = self.db.state
+        await state.flush()  # the script must see the pending do() and clear()
+        results = await TRY_ACQUIRE_SINGLE_SCRIPT(
+            self.db.redis,
+            keys=keys,
+            args=[repr(now)] + [float(cooldowns[name]) for name in names]
+        )
+        results = [bool(int(r)) for r in results]
+        for key, acquired in zip(keys, results):
+            if acquired:
+                state.remember(key, now, FLOAT)
+            else:
+                state.invalidate(key)
+        return dict(zip(names, results))
 
     async def clear(self, event_name):
-        await self.db.redis.set(self.get_key(event_name), 0.0)
+        self.db.state.set(self.get_key(event_name), 0.0, FLOAT)
 
 
 @dataclass
@@ -71,11 +143,18 @@ class Cooldown:
         return cd.can_do(self.cooldown)
 
     async def do(self):
-        cd = await self.read(self.event_name)
-        if not cd.can_do(self.cooldown):
-            return
-        cd.increment_count(self.max_times)
-        await self.write(self.event_name, cd)
+        await self.try_acquire()
+
+    async def try_acquire(self) -> bool:
+        """
+        Atomic can_do + do: True if the event is allowed now (and it is counted)
+        """
+        result = await TRY_ACQUIRE_RECORD_SCRIPT(
+            self.db.redis,
+            keys=[self.get_key(self.event_name)],
+            args=[repr(time()), float(self.cooldown), int(self.max_times)]
+        )
+        return bool(int(result))
 
     async def clear(self, event_name):
         await self.write(event_name, cd=CooldownRecord(0, 0))
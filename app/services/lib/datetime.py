@@ -2,6 +2,8 @@ from datetime import datetime
 
 import pandas as pd
 
+from services.lib.stream_columns import stream_to_columns
+
 MINUTE = 60
 HOUR = 60 * 60
 DAY = 24 * 60 * 60
@@ -105,25 +107,18 @@ def format_time_ago_short(d, now=None):
 
 
 def series_to_pandas(ts_result, shift_time=True):
-    normal_data = []
-    zero_t = None
-    for key, value_d in ts_result:
-        key = key.decode('ascii').split('-')
-        event_id = int(key[1])
-        if event_id > 99:
-            continue
-
-        # ms -> sec; + up to 100 events 0.01 sec each
-        time_point = float(key[0]) / 1000.0 + 0.01 * event_id
-        if zero_t is None:
-            zero_t = time_point
-
-        values = {
-            k.decode('ascii'): float(v) for k, v in value_d.items()
-        }
-
-        normal_data.append({
-            "t": (time_point - zero_t) if shift_time else time_point,
-            **values
-        })
-    return pd.DataFrame(normal_data)
+    columns = stream_to_columns(ts_result)
+    ms, event_id = columns.pop('ms'), columns.pop('seq')
+    keep = event_id <= 99
+    if not keep.any():
+        return pd.DataFrame()
+
+    # ms -> sec; + up to 100 events 0.01 sec each
+    time_point = ms[keep] / 1000.0 + 0.01 * event_id[keep]
+    if shift_time:
+        time_point -= time_point[0]
+
+    return pd.DataFrame({
+        "t": time_point,
+        **{k: v[keep] for k, v in columns.items()}
+    })
@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 import typing
 from contextlib import asynccontextmanager
 
@@ -6,6 +8,8 @@ import aioredis
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
 from aiogram.dispatcher import FSMContext
 
+from services.lib.state_cache import StateCache
+
 
 class DB:
     def __init__(self, loop):
@@ -15,21 +19,41 @@ class DB:
         self.host = os.environ.get('REDIS_HOST', 'localhost')
         self.port = os.environ.get('REDIS_PORT', 6379)
         self.password = os.environ.get('REDIS_PASSWORD', None)
+        self.pool_min_size = int(os.environ.get('REDIS_POOL_MIN', 2))
+        self.pool_max_size = int(os.environ.get('REDIS_POOL_MAX', 10))
+        self._connect_lock: typing.Optional[asyncio.Lock] = None
+        self.state = StateCache(self)  # hot small keys, see StateCache
+
+        # pool usage by connection() callers; plain commands take a free connection for themselves
+        self.n_acquired = 0
+        self.n_waited = 0  # acquisitions that found the pool exhausted
+        self.max_wait_sec = 0.0
+        self.peak_in_use = 0
 
     async def get_redis(self) -> aioredis.Redis:
         if self.redis is not None:
             return self.redis
 
-        try:
-            self.redis = await aioredis.create_redis(
-                f'redis://{self.host}:{self.port}',
-                password=self.password,
-                loop=self.loop)
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
 
-            self.storage = RedisStorage2(prefix='fsm')
-            self.storage._redis = self.redis
-        except Exception as e:
-            print(e)
+        async with self._connect_lock:
+            if self.redis is not None:
+                return self.redis  # another caller has connected while we were waiting
+
+            try:
+                redis = await aioredis.create_redis_pool(
+                    f'redis://{self.host}:{self.port}',
+                    password=self.password,
+                    minsize=self.pool_min_size,
+                    maxsize=self.pool_max_size,
+                    loop=self.loop)
+
+                self.storage = RedisStorage2(prefix='fsm')
+                self.storage._redis = redis
+                self.redis = redis
+            except Exception as e:
+                print(e)
 
         return self.redis
 
@@ -38,9 +62,62 @@ class DB:
         return self.storage
 
     async def close_redis(self):
+        await self.state.flush()
         self.redis.close()
         await self.redis.wait_closed()
 
+    @property
+    def pool(self) -> aioredis.ConnectionsPool:
+        return self.redis.connection
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        A connection of the pool for exclusive use (blocking commands, WATCH, long scans):
+            async with db.connection() as r:
+                await r.blpop(...)
+        """
+        await self.get_redis()
+        pool = self.pool
+        t0 = time.monotonic()
+        if not pool.freesize and pool.size >= pool.maxsize:
+            self.n_waited += 1
+        conn = await pool.acquire()
+        self.n_acquired += 1
+        self.max_wait_sec = max(self.max_wait_sec, time.monotonic() - t0)
+        self.peak_in_use = max(self.peak_in_use, pool.size - pool.freesize)
+        try:
+            yield aioredis.Redis(conn)
+        finally:
+            pool.release(conn)
+
+    async def pipeline(self, transaction=False):
+        """
+        pipe = await db.pipeline()
+        pipe.set(...); pipe.xadd(...)
+        results = await pipe.execute()
+        :param transaction: MULTI/EXEC instead of a plain pipeline
+        """
+        r = await self.get_redis()
+        return r.multi_exec() if transaction else r.pipeline()
+
+    @property
+    def pool_stats(self):
+        if self.redis is None:
+            return {}
+        pool = self.pool
+        in_use = pool.size - pool.freesize
+        return {
+            'size': pool.size,
+            'max_size': pool.maxsize,
+            'in_use': in_use,
+            'saturated': in_use >= pool.maxsize,
+            'acquired': self.n_acquired,
+            'waited': self.n_waited,
+            'max_wait_sec': self.max_wait_sec,
+            'peak_in_use': self.peak_in_use,
+        }
+
     @asynccontextmanager
     async def tg_context(self, user=None, chat=None):
         fsm = FSMContext(self.storage, chat, user)
@@ -16,7 +16,8 @@ class DepContainer:
     db: typing.Optional['DB'] = None
     loop: typing.Optional[asyncio.BaseEventLoop] = None
 
-    session: typing.Optional[ClientSession] = None
+    http: typing.Optional['HttpClient'] = None
+    session: typing.Optional[ClientSession] = None  # = http.session, shared by all fetchers
 
     bot: typing.Optional['Bot'] = None
     dp: typing.Optional['Dispatcher'] = None
@@ -0,0 +1,60 @@
+import logging
+from typing import Optional
+
+import aiohttp
+import ujson
+
+from services.lib.config import Config
+
+
+class HttpClient:
+    """
+    One shared aiohttp session for every fetcher: keep-alive connection pools per host, DNS cache and default timeouts.
+    Must be started inside the running event loop.
+    """
+
+    def __init__(self, limit=100, limit_per_host=8, dns_cache_ttl=300, keepalive_timeout=60,
+                 total_timeout=30.0, connect_timeout=5.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host  # THORNodes are separate hosts (IPs), so keep it low
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.total_timeout = total_timeout
+        self.connect_timeout = connect_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.logger = logging.getLogger('HttpClient')
+
+    @classmethod
+    def from_config(cls, cfg: Config):
+        http_cfg = cfg.get('http') or {}
+        return cls(
+            limit=int(http_cfg.get('limit', 100)),
+            limit_per_host=int(http_cfg.get('limit_per_host', 8)),
+            dns_cache_ttl=int(http_cfg.get('dns_cache_ttl', 300)),
+            keepalive_timeout=float(http_cfg.get('keepalive_timeout', 60)),
+            total_timeout=float(http_cfg.get('total_timeout', 30.0)),
+            connect_timeout=float(http_cfg.get('connect_timeout', 5.0)),
+        )
+
+    def start(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             use_dns_cache=True,
+                                             ttl_dns_cache=self.dns_cache_ttl,
+                                             keepalive_timeout=self.keepalive_timeout)
+            timeout = aiohttp.ClientTimeout(total=self.total_timeout, sock_connect=self.connect_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                  json_serialize=ujson.dumps)
+            self.logger.info(f'started: limit={self.limit}, limit_per_host={self.limit_per_host}, '
+                             f'dns_ttl={self.dns_cache_ttl}s, timeout={self.total_timeout}s')
+        return self._session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.start()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,70 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, List
+
+SCAN_BATCH = 500
+
+
+async def scan_batches(db: 'DB', match='*', batch=SCAN_BATCH) -> AsyncIterator[List[bytes]]:
+    """
+    Keys matching the pattern in lists of up to "batch", by cursor (SCAN), so Redis is never blocked like by KEYS.
+    A key may come twice if the keyspace is rehashed meanwhile.
+    """
+    r = await db.get_redis()
+    keys = []
+    async for key in r.iscan(match=match, count=batch):
+        keys.append(key)
+        if len(keys) >= batch:
+            yield keys
+            keys = []
+    if keys:
+        yield keys
+
+
+async def unlink_matching(db: 'DB', match, batch=SCAN_BATCH) -> int:
+    """
+    Deletes keys matching the pattern with UNLINK (memory is freed in the background), a batch at a time
+    :return: number of deleted keys
+    """
+    r = await db.get_redis()
+    deleted = 0
+    async for keys in scan_batches(db, match, batch):
+        deleted += await r.unlink(*keys)
+    return deleted
+
+
+@dataclass
+class PrefixStats:
+    keys: int = 0
+    memory_bytes: int = 0
+
+
+def key_prefix(key: bytes, prefixes: Iterable[str] = (), separator=':'):
+    key = key.decode(errors='replace')
+    for prefix in prefixes:
+        if key.startswith(prefix):
+            return prefix
+    return key.split(separator, 1)[0]
+
+
+async def keyspace_report(db: 'DB', prefixes: Iterable[str] = (), match='*', with_memory=True,
+                          batch=SCAN_BATCH) -> Dict[str, PrefixStats]:
+    """
+    Number of keys and their memory (MEMORY USAGE, sent concurrently per batch) by prefix.
+    :param prefixes: known prefixes (e.g. "ts-stream:price-"); the others are grouped by the part before the first ":"
+    """
+    r = await db.get_redis()
+    prefixes = sorted(prefixes, key=len, reverse=True)  # the most specific first
+    report: Dict[str, PrefixStats] = {}
+    async for keys in scan_batches(db, match, batch):
+        sizes = [0] * len(keys)
+        if with_memory:
+            # sent together over the pool, like a pipeline
+            sizes = await asyncio.gather(*(r.execute(b'MEMORY', b'USAGE', key) for key in keys),
+                                         return_exceptions=True)
+        for key, size in zip(keys, sizes):
+            stats = report.setdefault(key_prefix(key, prefixes), PrefixStats())
+            stats.keys += 1
+            if isinstance(size, int):  # None if the key has gone meanwhile
+                stats.memory_bytes += size
+    return report
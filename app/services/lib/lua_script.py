@@ -0,0 +1,24 @@
+import hashlib
+
+import aioredis
+
+
+class LuaScript:
+    """
+    A Lua script called by its SHA1 (EVALSHA): only the digest goes over the network.
+    The source is loaded on the first NOSCRIPT reply (first use, Redis restart or SCRIPT FLUSH).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    async def __call__(self, redis: aioredis.Redis, keys=(), args=()):
+        keys, args = list(keys), list(args)
+        try:
+            return await redis.evalsha(self.sha, keys=keys, args=args)
+        except aioredis.ReplyError as e:
+            if not str(e).startswith('NOSCRIPT'):
+                raise
+        await redis.script_load(self.source)
+        return await redis.evalsha(self.sha, keys=keys, args=args)
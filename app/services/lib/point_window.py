@@ -0,0 +1,91 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class RollingPointWindow:
+    """
+    Recent (ts, value) points sorted by time plus their prefix sums, so that the average over any
+    time range is two binary searches. Points older than "horizon_sec" behind the newest one are evicted.
+    """
+
+    def __init__(self, horizon_sec):
+        assert horizon_sec > 0
+        self.horizon_sec = horizon_sec
+        self.covered_from = float('inf')  # the window has every point of the series since this ts
+        self._ts = array('d')
+        self._values = array('d')
+        self._prefix = array('d', [0.0])  # _prefix[i] = sum(_values[:i])
+
+    def __len__(self):
+        return len(self._ts)
+
+    def _rebuild_prefix(self, start=0):
+        del self._prefix[start + 1:]
+        acc = self._prefix[start]
+        for v in self._values[start:]:
+            acc += v
+            self._prefix.append(acc)
+
+    def load(self, ts_list, values, covered_from):
+        """
+        Replaces the contents, e.g. with the points read from the DB; "ts_list" must be ascending
+        """
+        self._ts = array('d', ts_list)
+        self._values = array('d', values)
+        self._prefix = array('d', [0.0])
+        self._rebuild_prefix()
+        self.covered_from = covered_from
+        self._evict()
+
+    def push(self, ts, value):
+        ts, value = float(ts), float(value)
+        if not self._ts or ts >= self._ts[-1]:
+            self._ts.append(ts)
+            self._values.append(value)
+            self._prefix.append(self._prefix[-1] + value)
+        else:
+            # late point (backfill): rare, so O(n) is fine
+            i = bisect_right(self._ts, ts)
+            self._ts.insert(i, ts)
+            self._values.insert(i, value)
+            self._rebuild_prefix(i)
+        self._evict()
+
+    def _evict(self):
+        if not self._ts:
+            return
+        cutoff = self._ts[-1] - self.horizon_sec
+        n_old = bisect_left(self._ts, cutoff)
+        # amortized: drop in chunks, not one point per push
+        if n_old > max(16, len(self._ts) // 4):
+            del self._ts[:n_old]
+            del self._values[:n_old]
+            self._prefix = array('d', [0.0])
+            self._rebuild_prefix()
+            self.covered_from = max(self.covered_from, cutoff)
+
+    def covers(self, start_ts):
+        return start_ts >= self.covered_from
+
+    def _range(self, start_ts, end_ts):
+        return bisect_left(self._ts, start_ts), bisect_right(self._ts, end_ts)
+
+    def count(self, start_ts, end_ts):
+        i, j = self._range(start_ts, end_ts)
+        return max(0, j - i)
+
+    def average(self, start_ts, end_ts):
+        """
+        :return: average of the points within [start_ts, end_ts] or None if there are none
+        """
+        i, j = self._range(start_ts, end_ts)
+        if j <= i:
+            return None
+        return (self._prefix[j] - self._prefix[i]) / (j - i)
+
+    def last_before(self, ts):
+        """
+        :return: (ts, value) of the latest point not after "ts" or None
+        """
+        i = bisect_right(self._ts, ts)
+        return (self._ts[i - 1], self._values[i - 1]) if i else None
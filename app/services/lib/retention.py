@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Dict
+
+from services.lib.datetime import parse_timespan_to_seconds
+from services.lib.rollup import ROLLUP_LABELS
+
+RAW = 0  # "resolution" of the raw points
+
+
+@dataclass
+class RetentionPolicy:
+    max_age: Dict[int, int] = field(default_factory=dict)  # resolution (RAW or rollup sec) -> max age sec; 0 = forever
+    max_len: int = 0  # approximate cap on the raw stream length applied on every write; 0 = no cap
+
+    def max_age_for(self, resolution=RAW):
+        return self.max_age.get(resolution, 0)
+
+    @classmethod
+    def from_dict(cls, d: dict, base: 'RetentionPolicy' = None):
+        """
+        d = {'raw': '30d', '1m': '90d', '1h': '730d', '1d': 0, 'max_len': 100000}
+        """
+        labels = {label: res for res, label in ROLLUP_LABELS.items()}
+        labels['raw'] = RAW
+        max_age = dict(base.max_age) if base else {}
+        max_len = base.max_len if base else 0
+        for k, v in (d or {}).items():
+            if k == 'max_len':
+                max_len = int(v)
+            elif k in labels:
+                seconds = parse_timespan_to_seconds(str(v))
+                if isinstance(seconds, str):
+                    raise ValueError(f'retention "{k}": {seconds}')
+                max_age[labels[k]] = seconds
+            else:
+                raise KeyError(f'unknown retention key "{k}"')
+        return cls(max_age, max_len)
+
+
+class RetentionRegistry:
+    """
+    Series name (exact or fnmatch pattern, e.g. "POOL-DEPTH-*") -> RetentionPolicy
+    """
+
+    DEFAULT = 'default'
+
+    def __init__(self, default: RetentionPolicy = None, by_name: Dict[str, RetentionPolicy] = None):
+        self.default = default or RetentionPolicy()
+        self.by_name = by_name or {}
+
+    def policy_for(self, series_name) -> RetentionPolicy:
+        policy = self.by_name.get(series_name)
+        if policy is not None:
+            return policy
+        for pattern, policy in self.by_name.items():
+            if fnmatchcase(series_name, pattern):
+                return policy
+        return self.default
+
+    @classmethod
+    def from_config(cls, retention_cfg: dict):
+        """
+        retention_cfg = {'default': {...}, 'price-*': {...}, 'thor_queue': {...}}; named ones extend the default
+        """
+        retention_cfg = dict(retention_cfg or {})
+        default = RetentionPolicy.from_dict(retention_cfg.pop(cls.DEFAULT, None))
+        by_name = {name: RetentionPolicy.from_dict(d, base=default) for name, d in retention_cfg.items()}
+        return cls(default, by_name)
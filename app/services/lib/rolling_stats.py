@@ -0,0 +1,72 @@
+import base64
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable
+
+
+class RollingQuantiles:
+    """
+    Last N numbers in a ring buffer plus a sorted copy of them:
+    push is O(log N) search + a memmove, median/quantiles are O(1).
+    Packs into a compact base64 string of float64 (in arrival order) for storage.
+    """
+
+    TYPECODE = 'd'
+
+    def __init__(self, capacity=50, values: Iterable[float] = ()):
+        assert capacity > 0
+        self.capacity = capacity
+        self._ring = array(self.TYPECODE)
+        self._head = 0  # index of the oldest element once the ring is full
+        self._sorted = array(self.TYPECODE)
+        for v in values:
+            self.push(v)
+
+    def __len__(self):
+        return len(self._ring)
+
+    def push(self, x):
+        x = float(x)
+        if len(self._ring) < self.capacity:
+            self._ring.append(x)
+        else:
+            oldest = self._ring[self._head]
+            del self._sorted[bisect_left(self._sorted, oldest)]
+            self._ring[self._head] = x
+            self._head = (self._head + 1) % self.capacity
+        insort(self._sorted, x)
+
+    @property
+    def values(self):
+        """
+        In arrival order, the oldest first
+        """
+        return list(self._ring[self._head:]) + list(self._ring[:self._head])
+
+    def resize(self, capacity):
+        if capacity != self.capacity:
+            values = self.values[-capacity:]
+            self.__init__(capacity, values)
+
+    def quantile(self, q):
+        n = len(self._sorted)
+        if not n:
+            return 0.0
+        pos = min(max(q, 0.0), 1.0) * (n - 1)
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        return self._sorted[lo] + (self._sorted[hi] - self._sorted[lo]) * (pos - lo)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+    def encode(self) -> str:
+        return base64.b64encode(array(self.TYPECODE, self.values).tobytes()).decode('ascii')
+
+    @classmethod
+    def decode(cls, packed: str, capacity=50):
+        values = array(cls.TYPECODE)
+        if packed:
+            values.frombytes(base64.b64decode(packed))
+        return cls(capacity, values[-capacity:])
@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+
+from services.lib.datetime import MINUTE, HOUR, DAY
+
+DEFAULT_ROLLUPS = (MINUTE, HOUR, DAY)
+
+ROLLUP_LABELS = {
+    MINUTE: '1m',
+    HOUR: '1h',
+    DAY: '1d',
+}
+
+STAT_MIN, STAT_MAX, STAT_AVG, STAT_LAST, STAT_N = 'min', 'max', 'avg', 'last', 'n'
+
+
+def rollup_label(resolution_sec):
+    return ROLLUP_LABELS.get(resolution_sec, f'{resolution_sec}s')
+
+
+def parse_stream_id(ident) -> Tuple[int, int]:
+    if isinstance(ident, bytes):
+        ident = ident.decode('ascii')
+    ms, _, seq = str(ident).partition('-')
+    return int(ms), int(seq or 0)
+
+
+@dataclass
+class FieldStats:
+    min: float
+    max: float
+    sum: float
+    last: float
+    n: int
+
+    def merge(self, other: 'FieldStats'):
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum += other.sum
+        self.last = other.last
+        self.n += other.n
+
+    @property
+    def avg(self):
+        return self.sum / self.n if self.n else 0.0
+
+
+def stats_of_raw_entry(fields: dict) -> Dict[str, FieldStats]:
+    result = {}
+    for k, v in fields.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        try:
+            v = float(v)
+        except ValueError:
+            continue  # not a number (e.g. json)
+        result[k] = FieldStats(v, v, v, v, 1)
+    return result
+
+
+def stats_of_rollup_entry(fields: dict) -> Dict[str, FieldStats]:
+    parts = {}
+    for k, v in fields.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        name, _, stat = k.rpartition('_')
+        parts.setdefault(name, {})[stat] = float(v)
+    result = {}
+    for name, p in parts.items():
+        n = int(p.get(STAT_N, 1))
+        result[name] = FieldStats(p[STAT_MIN], p[STAT_MAX], p[STAT_AVG] * n, p[STAT_LAST], n)
+    return result
+
+
+def aggregate_buckets(entries: Iterable, resolution_sec, from_rollup=False) -> Dict[int, Dict[str, FieldStats]]:
+    """
+    Groups XRANGE entries (oldest first) into time buckets of "resolution_sec"
+    :return: bucket start (ms) -> field -> stats
+    """
+    res_ms = int(resolution_sec * 1000)
+    decoder = stats_of_rollup_entry if from_rollup else stats_of_raw_entry
+    buckets = {}
+    for ident, fields in entries:
+        ms, _ = parse_stream_id(ident)
+        bucket_start = ms - ms % res_ms
+        bucket = buckets.setdefault(bucket_start, {})
+        for name, st in decoder(fields).items():
+            if name in bucket:
+                bucket[name].merge(st)
+            else:
+                bucket[name] = st
+    return buckets
+
+
+def encode_rollup_fields(bucket: Dict[str, FieldStats]) -> dict:
+    fields = {}
+    for name, st in bucket.items():
+        fields[f'{name}_{STAT_MIN}'] = st.min
+        fields[f'{name}_{STAT_MAX}'] = st.max
+        fields[f'{name}_{STAT_AVG}'] = st.avg
+        fields[f'{name}_{STAT_LAST}'] = st.last
+        fields[f'{name}_{STAT_N}'] = st.n
+    return fields
+
+
+def rollup_entry_as_raw(fields: dict, stat=STAT_AVG) -> dict:
+    """
+    Rollup entry -> raw-looking entry with one value per field (the average by default)
+    """
+    suffix = f'_{stat}'.encode()
+    return {k[:-len(suffix)]: v for k, v in fields.items() if k.endswith(suffix)}
+
+
+def choose_resolution(period_sec, target_points, resolutions=DEFAULT_ROLLUPS):
+    """
+    The coarsest resolution that still gives at least "target_points" over the period; 0 means raw data
+    """
+    for res in sorted(resolutions, reverse=True):
+        if period_sec / res >= target_points:
+            return res
+    return 0
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Union
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    job: Callable[[], Awaitable]
+    period: Union[float, Callable[[], float]]  # a callable is re-read after every run (adaptive polling)
+    offset: float = 0.0  # sec after the scheduler start
+    jitter: float = 0.0  # random delay up to this many sec added to every run, never accumulates
+    runs: int = 0
+    overruns: int = 0
+    skipped: int = 0
+    last_duration: float = 0.0
+    task: asyncio.Task = field(default=None, repr=False)
+
+    @property
+    def current_period(self):
+        return float(self.period()) if callable(self.period) else self.period
+
+
+class FixedRateScheduler:
+    """
+    Runs async jobs at fixed rates: the n-th run of a job is due at start + offset + n * period,
+    whatever the previous run took. If a run overruns, the missed slots are skipped and reported.
+    """
+
+    def __init__(self, start_delay=1.0, rng: random.Random = None):
+        self.start_delay = start_delay
+        self.jobs: List[ScheduledJob] = []
+        self._rng = rng or random.Random()
+        self.logger = logging.getLogger('FixedRateScheduler')
+
+    def add(self, job: Callable[[], Awaitable], period, offset=0.0, jitter=0.0, name=None):
+        if not callable(period):
+            assert period > 0
+            period = float(period)
+        name = name or getattr(job, '__qualname__', repr(job))
+        self.jobs.append(ScheduledJob(name, job, period, float(offset), float(jitter)))
+        return self
+
+    @staticmethod
+    def advance(due, now, period):
+        """
+        :return: next due time (not in the past) and the number of skipped slots
+        """
+        due += period
+        skipped = 0
+        if now > due:
+            skipped = int((now - due) // period) + 1
+            due += skipped * period
+        return due, skipped
+
+    async def _job_loop(self, sj: ScheduledJob, start):
+        due = start + sj.offset
+        while True:
+            delay = due - time.monotonic()
+            if sj.jitter > 0:
+                delay += self._rng.uniform(0, sj.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            t0 = time.monotonic()
+            try:
+                await sj.job()
+            except Exception as e:
+                self.logger.exception(f'job "{sj.name}" failed: {e}')
+            now = time.monotonic()
+            sj.runs += 1
+            sj.last_duration = now - t0
+
+            period = sj.current_period
+            due, skipped = self.advance(due, now, period)
+            if skipped:
+                sj.overruns += 1
+                sj.skipped += skipped
+                self.logger.warning(f'job "{sj.name}" overran: took {sj.last_duration:.1f} sec '
+                                    f'with period {period:.1f} sec; skipped {skipped} slot(s)')
+
+    async def run(self):
+        start = time.monotonic() + self.start_delay
+        for sj in self.jobs:
+            sj.task = asyncio.create_task(self._job_loop(sj, start))
+        await asyncio.gather(*(sj.task for sj in self.jobs))
+
+    @property
+    def stats(self):
+        return {
+            sj.name: {
+                'runs': sj.runs,
+                'overruns': sj.overruns,
+                'skipped': sj.skipped,
+                'last_duration': sj.last_duration,
+            } for sj in self.jobs
+        }
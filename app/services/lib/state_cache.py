@@ -0,0 +1,257 @@
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+class Codec:
+    """
+    Value of a key <-> its bytes in Redis; this one is for strings
+    """
+
+    def encode(self, value) -> bytes:
+        return str(value).encode('utf-8')
+
+    def decode(self, raw: bytes):
+        return raw.decode('utf-8')
+
+    def copy(self, value):
+        """
+        What a hit returns from the decoded value kept in memory; mutable values must be copied
+        """
+        return value
+
+
+class FloatCodec(Codec):
+    def encode(self, value) -> bytes:
+        return repr(float(value)).encode('ascii')
+
+    def decode(self, raw: bytes):
+        return float(raw)
+
+
+class ModelCodec(Codec):
+    """
+    A BaseModelMixin dataclass as JSON
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+
+    def encode(self, value) -> bytes:
+        return value.as_json.encode('utf-8')
+
+    def decode(self, raw: bytes):
+        return self.cls.from_json(raw)
+
+    def copy(self, value):
+        return copy.copy(value)
+
+
+STR = Codec()
+FLOAT = FloatCodec()
+
+
+class StateCache:
+    """
+    Small string keys of Redis (th_info, runeATH, cd_evt:*, user:lang:*) mirrored in process memory.
+    Reads are served from memory until the TTL expires; writes change the memory at once
+    and are flushed to Redis by a background task a moment later (write-behind), many keys in one pipeline.
+    With a codec, get/set take and return values instead of bytes; the decoded value is kept in memory too,
+    so a hit doesn't parse it again.
+    """
+
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self, db: 'DB', ttl=30.0, flush_delay=0.5, max_size=10000):
+        self.db = db
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.max_size = max_size
+        # key -> (value bytes or None, expires at, (codec, decoded value) or None), LRU order
+        self._values: OrderedDict = OrderedDict()
+        self._dirty: Dict[str, Optional[bytes]] = {}  # key -> value to write; None = delete
+        # a read from Redis must not overwrite a write made while it was waiting
+        self._writes = 0
+        self._written: Dict[str, int] = {}  # key -> _writes at its last change; kept while reads are in flight
+        self._cleared = 0  # _writes at the last invalidate() of all keys
+        self._reading = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self.hits = self.misses = 0
+        self.logger = logging.getLogger('StateCache')
+
+    @staticmethod
+    def _encode(value, codec: Codec = None) -> Optional[bytes]:
+        if value is None or isinstance(value, bytes):
+            return value
+        return (codec or STR).encode(value)
+
+    def _lookup(self, key):
+        if key in self._dirty:
+            return True, self._dirty[key]
+        entry = self._values.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self._values.move_to_end(key)
+            return True, entry[0]
+        return False, None
+
+    def _decode(self, key, raw, codec: Codec = None):
+        if codec is None or raw is None:
+            return raw
+        entry = self._values.get(key)
+        if entry is not None and entry[0] is raw and entry[2] is not None and entry[2][0] is codec:
+            return codec.copy(entry[2][1])
+        value = codec.decode(raw)
+        if entry is not None and entry[0] is raw:
+            self._values[key] = (raw, entry[1], (codec, value))
+        return codec.copy(value)
+
+    def _store(self, key, raw, decoded=None):
+        self._values[key] = (raw, time.monotonic() + self.ttl, decoded)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def _mark_written(self, key):
+        self._writes += 1
+        if self._reading:
+            self._written[key] = self._writes
+
+    async def _read(self, keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Reads the keys from Redis and remembers the values, except for the keys changed during the read:
+        for them the memory wins
+        """
+        started = self._writes
+        self._reading += 1
+        try:
+            r = await self.db.get_redis()
+            values = [await r.get(keys[0])] if len(keys) == 1 else await r.mget(*keys)
+        finally:
+            self._reading -= 1
+
+        results = []
+        for key, value in zip(keys, values):
+            if self._written.get(key, 0) > started or self._cleared > started:
+                found, current = self._lookup(key)
+                results.append(current if found else value)
+            else:
+                self._store(key, value)
+                results.append(value)
+        if not self._reading:
+            self._written.clear()
+        return results
+
+    def _remember(self, key, value, codec: Codec = None) -> Optional[bytes]:
+        raw = self._encode(value, codec)
+        self._mark_written(key)
+        decoded = (codec, codec.copy(value)) if codec is not None and raw is not None and raw is not value else None
+        self._store(key, raw, decoded)
+        return raw
+
+    def remember(self, key, value, codec: Codec = None):
+        """
+        Puts the value to memory only: it is already in Redis
+        """
+        self._remember(key, value, codec)
+
+    async def get(self, key, codec: Codec = None):
+        """
+        :param codec: decode the value with it (e.g. FLOAT); bytes by default. A missing key is None either way
+        """
+        found, raw = self._lookup(key)
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+            raw = (await self._read([key]))[0]
+        return self._decode(key, raw, codec)
+
+    async def get_many(self, keys: Iterable[str], codec: Codec = None) -> list:
+        keys = list(keys)
+        results, missing = {}, []
+        for key in keys:
+            found, value = self._lookup(key)
+            if found:
+                results[key] = value
+            else:
+                missing.append(key)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            results.update(zip(missing, await self._read(missing)))
+        return [self._decode(key, results[key], codec) for key in keys]
+
+    def set(self, key, value, codec: Codec = None):
+        """
+        :param codec: encode the value with it; str() by default, bytes are stored as is and None deletes the key
+        """
+        self._dirty[key] = self._remember(key, value, codec)
+        self._schedule_flush()
+
+    def delete(self, key):
+        self.set(key, None)
+
+    def invalidate(self, key=None):
+        """
+        Forgets the memory copy of the key (or of all keys); pending writes are kept
+        """
+        if key is None:
+            self._values.clear()
+            self._writes += 1
+            self._cleared = self._writes
+        else:
+            self._values.pop(key, None)
+            self._mark_written(key)
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """
+        Runs while there is something to write, including the writes made during a flush;
+        retries failures with a growing delay
+        """
+        delay = self.flush_delay
+        while self._dirty:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                delay = self.flush_delay
+            except Exception as e:
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                self.logger.error(f'flush failed: {e}; retry in {delay:.1f} sec')
+
+    async def flush(self):
+        """
+        Writes all pending changes now; call it before reading these keys from Redis directly and on shutdown
+        """
+        if not self._dirty:
+            return
+        pending, self._dirty = self._dirty, {}
+        try:
+            r = await self.db.get_redis()
+            pipe = r.pipeline()
+            for key, value in pending.items():
+                if value is None:
+                    pipe.unlink(key)
+                else:
+                    pipe.set(key, value)
+            await pipe.execute()
+        except Exception:
+            # put back unless overwritten meanwhile
+            for key, value in pending.items():
+                self._dirty.setdefault(key, value)
+            raise
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self._values),
+            'pending': len(self._dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,54 @@
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+MISSING = b'nan'  # placeholder for a field absent in an entry; decodes to NaN
+
+
+def _as_bytes(x):
+    return x if isinstance(x, bytes) else str(x).encode('ascii')
+
+
+def decode_stream_ids(idents) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stream ids [b'1610000000000-0', ...] -> (ms, seq) int64 arrays, parsed in one go
+    """
+    if not idents:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    joined = b' '.join(map(_as_bytes, idents))
+    if b'-' not in joined:
+        ms = np.array(joined.split()).astype(np.int64)
+        return ms, np.zeros_like(ms)
+    # every id must have both parts here
+    parts = np.array(joined.replace(b'-', b' ').split()).astype(np.int64).reshape(-1, 2)
+    return parts[:, 0], parts[:, 1]
+
+
+def decode_field_column(entries, key) -> np.ndarray:
+    """
+    One field of XRANGE entries -> float64 array; NaN where an entry has no such field
+    """
+    key = _as_bytes(key)
+    raw = [fields.get(key, MISSING) for _, fields in entries]
+    if not raw:
+        return np.empty(0, dtype=np.float64)
+    return np.array(raw).astype(np.float64)
+
+
+def stream_to_columns(entries, keys: Iterable = None) -> Dict[str, np.ndarray]:
+    """
+    XRANGE result -> columns: {'ms': int64, 'seq': int64, 'field_1': float64, ...}
+    :param keys: fields to decode (numeric ones only); all fields found in the entries by default
+    """
+    ms, seq = decode_stream_ids([ident for ident, _ in entries])
+    if keys is None:
+        keys = dict.fromkeys(k for _, fields in entries for k in fields)
+    columns = {'ms': ms, 'seq': seq}
+    for key in keys:
+        name = key.decode('ascii') if isinstance(key, bytes) else key
+        columns[name] = decode_field_column(entries, key)
+    return columns
+
+
+def ms_to_sec(ms: np.ndarray) -> np.ndarray:
+    return ms / 1000.0
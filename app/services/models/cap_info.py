@@ -3,6 +3,7 @@ import logging
 from dataclasses import dataclass
 
 from services.lib.db import DB
+from services.lib.state_cache import ModelCodec
 from services.models.base import BaseModelMixin
 
 
@@ -33,12 +34,14 @@ class ThorInfo(BaseModelMixin):
     @classmethod
     async def get_old_cap(cls, db: DB):
         try:
-            j = await db.redis.get(cls.KEY_INFO)
-            return ThorInfo.from_json(j)
+            info = await db.state.get(cls.KEY_INFO, THOR_INFO_CODEC)
+            return info if info is not None else ThorInfo.error()
         except (TypeError, ValueError, AttributeError, json.decoder.JSONDecodeError):
             logging.exception('get_old_cap error')
             return ThorInfo.error()
 
     async def save(self, db: DB):
-        r = await db.get_redis()
-        await r.set(self.KEY_INFO, self.as_json)
+        db.state.set(self.KEY_INFO, self, THOR_INFO_CODEC)
+
+
+THOR_INFO_CODEC = ModelCodec(ThorInfo)
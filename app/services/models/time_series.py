@@ -1,7 +1,20 @@
+import asyncio
 import json
+import logging
 import time
+from typing import Dict, Tuple, Optional, Iterable, Union
 
+import numpy as np
+
+from services.lib.datetime import DAY
 from services.lib.db import DB
+from services.lib.keyspace import scan_batches
+from services.lib.lua_script import LuaScript
+from services.lib.point_window import RollingPointWindow
+from services.lib.retention import RetentionRegistry, RAW
+from services.lib.rollup import aggregate_buckets, encode_rollup_fields, rollup_label, parse_stream_id, \
+    choose_resolution, rollup_entry_as_raw, DEFAULT_ROLLUPS, FieldStats
+from services.lib.stream_columns import decode_field_column, decode_stream_ids, stream_to_columns, ms_to_sec
 
 BNB_SYMBOL = 'BNB.BNB'
 BUSD_SYMBOL = 'BNB.BUSD-BD1'
@@ -11,15 +24,74 @@ BTCB_SYMBOL = 'BNB.BTCB-1DE'
 ETHB_SYMBOL = 'BNB.ETH-1C9'
 RUNE_SYMBOL_DET = 'RUNE-DET'
 
+# KEYS[1] = stream; ARGV = start, end, field, max count (0 = all), positive only (0/1)
+# -> {n, sum, min, max, last}; numbers as strings, Lua -> Redis integer conversion would truncate them
+AGGREGATE_SCRIPT = LuaScript("""
+local range
+if tonumber(ARGV[4]) > 0 then
+    range = redis.call('XRANGE', KEYS[1], ARGV[1], ARGV[2], 'COUNT', ARGV[4])
+else
+    range = redis.call('XRANGE', KEYS[1], ARGV[1], ARGV[2])
+end
+local field, positive_only = ARGV[3], ARGV[5] == '1'
+local n, sum, v_min, v_max, v_last = 0, 0, 0, 0, 0
+for _, entry in ipairs(range) do
+    local kv = entry[2]
+    for i = 1, #kv, 2 do
+        if kv[i] == field then
+            local v = tonumber(kv[i + 1])
+            if v and (v > 0 or not positive_only) then
+                if n == 0 or v < v_min then v_min = v end
+                if n == 0 or v > v_max then v_max = v end
+                n = n + 1
+                sum = sum + v
+                v_last = v
+            end
+            break
+        end
+    end
+end
+return {n, tostring(sum), tostring(v_min), tostring(v_max), tostring(v_last)}
+""")
+
 
 class TimeSeries:
-    def __init__(self, name: str, db: DB):
+    # (stream, resolution) -> start (ms) of the first bucket that is not rolled up yet; shared by all instances
+    _rollup_cursor: Dict[Tuple[str, int], int] = {}
+
+    # set from the config at startup (see configure_retention); keeps everything by default
+    retention = RetentionRegistry()
+
+    STREAM_PREFIX = 'ts-stream'
+
+    @classmethod
+    def configure_retention(cls, registry: RetentionRegistry):
+        cls.retention = registry
+
+    def __init__(self, name: str, db: DB, rollups=()):
+        """
+        :param rollups: resolutions (sec, ascending) of the downsampled companion streams
+            maintained on every add, e.g. DEFAULT_ROLLUPS
+        """
         self.db = db
         self.name = name
+        self.rollups = tuple(sorted(rollups))
+        self.logger = logging.getLogger('TimeSeries')
 
     @property
     def stream_name(self):
-        return f'ts-stream:{self.name}'
+        return f'{self.STREAM_PREFIX}:{self.name}'
+
+    @property
+    def retention_policy(self):
+        return self.retention.policy_for(self.name)
+
+    def rollup_stream_name(self, resolution):
+        return f'{self.stream_name}:{rollup_label(resolution)}'
+
+    def _rollup_source(self, i):
+        # 1m is built from the raw points; coarser ones - from the previous rollup
+        return (self.stream_name, False) if i == 0 else (self.rollup_stream_name(self.rollups[i - 1]), True)
 
     @staticmethod
     def range_ago(ago_sec, tolerance_sec=10):
@@ -42,17 +114,46 @@ class TimeSeries:
         s = index.decode().split('-')
         return int(s[0]) / 1_000
 
-    async def get_last_points(self, period_sec, max_points=10000, tolerance_sec=10):
-        points = await self.select(*self.range_from_ago_to_now(period_sec, tolerance_sec=tolerance_sec),
-                                   count=max_points)
+    async def get_last_points(self, period_sec, max_points=10000, tolerance_sec=10, target_points=None):
+        """
+        :param target_points: if set, read the coarsest rollup that still gives that many points over the period;
+            the points look like raw ones (field -> bucket average)
+        """
+        start, end = self.range_from_ago_to_now(period_sec, tolerance_sec=tolerance_sec)
+        if target_points and self.rollups:
+            r = await self.db.get_redis()
+            first_raw = await self.select(start, end, count=1)
+            first_raw_ms = parse_stream_id(first_raw[0][0])[0] if first_raw else None
+            resolution = choose_resolution(period_sec, target_points, self.rollups)
+            while resolution:
+                points = await r.xrange(self.rollup_stream_name(resolution), start, end, count=max_points)
+                # the rollup must cover the raw data from its beginning (up to the bucket cut by "start");
+                # it may lag behind, e.g. right after a deploy. No raw data: it's trimmed, the rollup is all we have
+                if points and (first_raw_ms is None or
+                               parse_stream_id(points[0][0])[0] <= first_raw_ms + resolution * 1000):
+                    return [(ident, rollup_entry_as_raw(fields)) for ident, fields in points]
+                finer = [res for res in self.rollups if res < resolution]
+                resolution = finer[-1] if finer else 0
+
+        points = await self.select(start, end, count=max_points)
         return points
 
     async def get_last_values(self, period_sec, key, max_points=10000, tolerance_sec=10, with_ts=False,
-                              decoder=float):
-        points = await self.get_last_points(period_sec, max_points, tolerance_sec)
+                              decoder=float, target_points=None):
+        points = await self.get_last_points(period_sec, max_points, tolerance_sec, target_points)
         if isinstance(key, str):
             key = key.encode('utf-8')
 
+        if decoder is float:
+            # columnar fast path
+            values = decode_field_column(points, key)
+            present = ~np.isnan(values)
+            values = values[present]
+            if with_ts:
+                ts, _ = decode_stream_ids([p[0] for p in points])
+                return list(zip(ms_to_sec(ts[present]).tolist(), values.tolist()))
+            return values.tolist()
+
         if with_ts:
             values = [(self.get_ts_from_index(p[0]), decoder(p[1][key])) for p in points if key in p[1]]
         else:
@@ -60,22 +161,226 @@ class TimeSeries:
 
         return values
 
+    async def get_last_columns(self, period_sec, keys=None, max_points=10000, tolerance_sec=10, target_points=None):
+        """
+        Like get_last_values, but all (numeric) fields at once as NumPy arrays: 'ms', 'seq' and one per field
+        """
+        points = await self.get_last_points(period_sec, max_points, tolerance_sec, target_points)
+        return stream_to_columns(points, keys)
+
     # noinspection PyTypeChecker
     async def get_last_values_json(self, period_sec, max_points=10000, tolerance_sec=10, with_ts=False):
         return await self.get_last_values(period_sec, 'json', max_points, tolerance_sec, with_ts, decoder=json.loads)
 
+    async def aggregate(self, start, end, key, max_points=0, positive_only=False) -> Optional[FieldStats]:
+        """
+        Stats of one numeric field over the ID range, computed by Redis: one round trip, one small reply
+        :param max_points: only the first N entries of the range; 0 - all
+        :param positive_only: skip values <= 0
+        :return: None if there are no such values
+        """
+        r = await self.db.get_redis()
+        key = key.decode() if isinstance(key, bytes) else key
+        n, total, v_min, v_max, v_last = await AGGREGATE_SCRIPT(
+            r, keys=[self.stream_name],
+            args=[start, end, key, int(max_points), 1 if positive_only else 0]
+        )
+        n = int(n)
+        if not n:
+            return None
+        return FieldStats(float(v_min), float(v_max), float(total), float(v_last), n)
+
     async def average(self, period_sec, key, max_points=10000, tolerance_sec=10):
-        values = await self.get_last_values(period_sec, key, max_points, tolerance_sec)
-        n = len(values)
-        return sum(values) / n if n else None
+        stats = await self.aggregate(*self.range_from_ago_to_now(period_sec, tolerance_sec), key, max_points)
+        return stats.avg if stats else None
 
     async def sum(self, period_sec, key, max_points=10000, tolerance_sec=10):
-        values = await self.get_last_values(period_sec, key, max_points, tolerance_sec)
-        return sum(values)
+        stats = await self.aggregate(*self.range_from_ago_to_now(period_sec, tolerance_sec), key, max_points)
+        return stats.sum if stats else 0
+
+    def xadd(self, target, fields: dict, message_id=b'*'):
+        """
+        XADD of a raw point to "target" (Redis or a pipeline) with the length cap of the retention policy
+        """
+        max_len = self.retention_policy.max_len or None
+        return target.xadd(self.stream_name, fields, message_id=message_id, max_len=max_len)  # "MAXLEN ~"
+
+    def add_to_pipeline(self, pipe, message_id=b'*', **kwargs):
+        """
+        Queues a point to a pipeline executed by the caller; rollups are not updated (see update_rollups)
+        """
+        return self.xadd(pipe, kwargs, message_id)
 
     async def add(self, message_id=b'*', **kwargs):
         r = await self.db.get_redis()
-        await r.xadd(self.stream_name, kwargs, message_id=message_id)
+        new_id = await self.xadd(r, kwargs, message_id)
+        if self.rollups:
+            await self.update_rollups(parse_stream_id(new_id)[0])
+        return new_id
+
+    async def add_many(self, points: Iterable[Tuple[Union[str, bytes], dict]], batch=1000, rebuild_rollups=True):
+        """
+        Bulk append with explicit IDs (backfills): XADDs are sent in pipelines of "batch" commands.
+        Redis rejects an ID that is not greater than the last one of the stream (e.g. a duplicate).
+        :param points: (message_id, fields) in any order
+        :param rebuild_rollups: recompute the rollup buckets the accepted points fall into (older ones are kept)
+        :return: the rejected IDs
+        """
+        points = sorted(points, key=lambda p: parse_stream_id(p[0]))
+        r = await self.db.get_redis()
+        rejected, accepted_ms = [], []
+        for i in range(0, len(points), batch):
+            chunk = points[i:i + batch]
+            pipe = r.pipeline()
+            for ident, fields in chunk:
+                self.xadd(pipe, fields, ident)
+            results = await pipe.execute(return_exceptions=True)
+            for (ident, _), result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    rejected.append(ident)
+                else:
+                    accepted_ms.append(parse_stream_id(ident)[0])
+
+        if rejected:
+            self.logger.warning(f'{self.name}: {len(rejected)} of {len(points)} points rejected, e.g. {rejected[0]}')
+        if rebuild_rollups and self.rollups and accepted_ms:
+            await self.rebuild_rollups(accepted_ms[0], accepted_ms[-1])
+        return rejected
+
+    async def _rollup_cursor_from_db(self, i, now_ms):
+        resolution = self.rollups[i]
+        r = await self.db.get_redis()
+        last = await r.xrevrange(self.rollup_stream_name(resolution), count=1)
+        res_ms = resolution * 1000
+        if last:
+            return parse_stream_id(last[0][0])[0] + res_ms
+
+        # no rollup yet: start with the oldest point of the source, so the existing history is rolled up too
+        source, _ = self._rollup_source(i)
+        first = await r.xrange(source, count=1)
+        start_ms = parse_stream_id(first[0][0])[0] if first else now_ms
+        return start_ms - start_ms % res_ms
+
+    async def update_rollups(self, now_ms):
+        """
+        Rolls up every closed bucket since the last call; cheap unless a bucket boundary was crossed
+        """
+        for i, resolution in enumerate(self.rollups):
+            res_ms = resolution * 1000
+            cursor_key = (self.stream_name, resolution)
+            cursor = self._rollup_cursor.get(cursor_key)
+            if cursor is None:
+                cursor = self._rollup_cursor[cursor_key] = await self._rollup_cursor_from_db(i, now_ms)
+
+            current_bucket = now_ms - now_ms % res_ms
+            if current_bucket <= cursor:
+                continue  # the bucket is still open
+
+            source, from_rollup = self._rollup_source(i)
+            await self._rollup_range(resolution, source, from_rollup, cursor, current_bucket - 1)
+            self._rollup_cursor[cursor_key] = current_bucket
+
+    async def _rollup_range(self, resolution, source, from_rollup, start_ms, end_ms, batch=10000, target=None):
+        r = await self.db.get_redis()
+        target = target or self.rollup_stream_name(resolution)
+        while start_ms <= end_ms:
+            entries = await r.xrange(source, start_ms, end_ms, count=batch)
+            if not entries:
+                break
+            last_ms = parse_stream_id(entries[-1][0])[0]
+            if len(entries) == batch:
+                # don't split a bucket between batches
+                last_full = last_ms - last_ms % (resolution * 1000) - 1
+                if last_full >= start_ms:
+                    entries = [e for e in entries if parse_stream_id(e[0])[0] <= last_full]
+                    last_ms = last_full
+
+            buckets = aggregate_buckets(entries, resolution, from_rollup)
+            if buckets:
+                pipe = r.pipeline()
+                for bucket_start in sorted(buckets.keys()):
+                    pipe.xadd(target, encode_rollup_fields(buckets[bucket_start]),
+                              message_id=f'{bucket_start}-0')
+                results = await pipe.execute(return_exceptions=True)
+                errors = [e for e in results if isinstance(e, Exception)]
+                if errors:
+                    self.logger.warning(f'{len(errors)} rollup entries rejected for {self.name}: {errors[0]}')
+            start_ms = last_ms + 1
+
+    async def _copy_entries(self, source, target, start, end, batch=1000):
+        r = await self.db.get_redis()
+        while True:
+            entries = await r.xrange(source, start, end, count=batch)
+            if not entries:
+                break
+            pipe = r.pipeline()
+            for ident, fields in entries:
+                pipe.xadd(target, fields, message_id=ident)
+            await pipe.execute()
+            ms, seq = parse_stream_id(entries[-1][0])
+            start = f'{ms}-{seq + 1}'
+
+    async def _rebuild_rollup(self, i, first, last):
+        resolution = self.rollups[i]
+        name = self.rollup_stream_name(resolution)
+        source, from_rollup = self._rollup_source(i)
+        r = await self.db.get_redis()
+        top = await r.xrevrange(name, count=1)
+        if not top or parse_stream_id(top[0][0])[0] < first:
+            # past the end of the rollup: plain append
+            await self._rollup_range(resolution, source, from_rollup, first, last)
+            return
+
+        # stream IDs only grow (even after XDEL), so the buckets are rewritten into a copy of the stream
+        tmp = f'{name}:rebuild'
+        await r.delete(tmp)
+        await self._copy_entries(name, tmp, '-', first - 1)
+        await self._rollup_range(resolution, source, from_rollup, first, last, target=tmp)
+        await self._copy_entries(name, tmp, last + 1, '+')
+        if await r.exists(tmp):
+            await r.rename(tmp, name)
+        else:
+            await r.delete(name)
+
+    async def rebuild_rollups(self, start_ms=0, end_ms=None):
+        """
+        Recomputes the closed rollup buckets overlapping [start_ms, end_ms] (ms), e.g. after a backfill.
+        The other entries are kept, so are the ones older than the first point of the source
+        (their raw points may be trimmed by the retention already).
+        """
+        if not self.rollups:
+            return
+        r = await self.db.get_redis()
+        now_ms = int(time.time() * 1000)
+        for i, resolution in enumerate(self.rollups):
+            res_ms = resolution * 1000
+            current_bucket = now_ms - now_ms % res_ms
+            cursor_key = (self.stream_name, resolution)
+            cursor = self._rollup_cursor.get(cursor_key)
+
+            source, _ = self._rollup_source(i)
+            oldest = await r.xrange(source, count=1)
+            if not oldest:
+                continue
+            oldest_ms = parse_stream_id(oldest[0][0])[0]
+            oldest_bucket = oldest_ms - oldest_ms % res_ms
+            oldest_rollup = await r.xrange(self.rollup_stream_name(resolution), count=1)
+            if oldest_rollup and parse_stream_id(oldest_rollup[0][0])[0] < oldest_bucket:
+                # the source has been trimmed: its first bucket may be partial, keep the rollup entry
+                oldest_bucket += res_ms
+
+            first = max(start_ms - start_ms % res_ms, oldest_bucket)
+            if cursor is not None:
+                first = min(first, cursor)  # don't skip the buckets update_rollups hasn't reached yet
+            last = current_bucket - 1
+            if end_ms is not None:
+                last = min(last, end_ms - end_ms % res_ms + res_ms - 1)
+            if last < first:
+                continue
+
+            await self._rebuild_rollup(i, first, last)
+            if cursor is not None and cursor <= last:
+                self._rollup_cursor[cursor_key] = last + 1
 
     async def add_as_json(self, message_id=b'*', j: dict = None):
         await self.add(message_id, json=json.dumps(j))
@@ -85,30 +390,136 @@ class TimeSeries:
         data = await r.xrange(self.stream_name, start, end, count=count)
         return data
 
+    @classmethod
+    def parse_stream_key(cls, key):
+        """
+        "ts-stream:name" -> (name, RAW); "ts-stream:name:1h" -> (name, 3600)
+        """
+        key = key.decode() if isinstance(key, bytes) else key
+        parts = key.split(':')
+        if len(parts) < 2 or parts[0] != cls.STREAM_PREFIX:
+            return None, RAW
+        if len(parts) == 2:
+            return parts[1], RAW
+        labels = {rollup_label(res): res for res in DEFAULT_ROLLUPS}
+        return parts[1], labels.get(parts[2])
+
+    @classmethod
+    async def trim_stream(cls, db: DB, key, now=None):
+        """
+        Trims one stream (raw or rollup) to its retention age with "XTRIM MINID ~" (approximate, cheap)
+        :return: number of deleted entries
+        """
+        name, resolution = cls.parse_stream_key(key)
+        if name is None or resolution is None:
+            return 0
+        max_age = cls.retention.policy_for(name).max_age_for(resolution)
+        if not max_age:
+            return 0
+        min_id = int(((now or time.time()) - max_age) * 1000)
+        r = await db.get_redis()
+        return await r.execute(b'XTRIM', key, b'MINID', b'~', min_id)
+
+    async def trim(self, now=None):
+        deleted = await self.trim_stream(self.db, self.stream_name, now)
+        for res in self.rollups:
+            deleted += await self.trim_stream(self.db, self.rollup_stream_name(res), now)
+        return deleted
+
     async def clear(self):
         r = await self.db.get_redis()
-        await r.delete(key=self.stream_name)
+        await r.delete(self.stream_name, *[self.rollup_stream_name(res) for res in self.rollups])
+        for res in self.rollups:
+            self._rollup_cursor.pop((self.stream_name, res), None)
 
 
 class PriceTimeSeries(TimeSeries):
-    def __init__(self, coin: str, db: DB):
-        super().__init__(f'price-{coin}', db)
+    # series name -> the recent points in memory (see warm_up); shared by all instances of the process
+    _windows: Dict[str, RollingPointWindow] = {}
+
+    def __init__(self, coin: str, db: DB, rollups=DEFAULT_ROLLUPS):
+        super().__init__(f'price-{coin}', db, rollups)
 
     KEY = b'price'
 
+    @property
+    def window(self) -> RollingPointWindow:
+        return self._windows.get(self.name)
+
+    async def warm_up(self, horizon_sec=8 * DAY):
+        """
+        Loads the last "horizon_sec" of prices into memory; from then on add() keeps the window up to date
+        and select_average_ago within the horizon doesn't touch Redis.
+        Assumes this process is the only writer of the series.
+        """
+        now = time.time()
+        points = await self.select(int((now - horizon_sec) * 1000), '+', count=None)
+        prices = decode_field_column(points, self.KEY)
+        ms, _ = decode_stream_ids([p[0] for p in points])
+        positive = prices > 0  # NaN (no price) is not
+        window = RollingPointWindow(horizon_sec)
+        window.load(ms_to_sec(ms[positive]).tolist(), prices[positive].tolist(), covered_from=now - horizon_sec)
+        self._windows[self.name] = window
+        self.logger.info(f'{self.name}: {len(window)} points cached')
+
+    async def add(self, message_id=b'*', **kwargs):
+        new_id = await super().add(message_id, **kwargs)
+        window = self.window
+        price = float(kwargs.get(self.KEY.decode(), 0.0))
+        if window is not None and price > 0:
+            window.push(parse_stream_id(new_id)[0] / 1000, price)
+        return new_id
+
+    async def add_many(self, points, batch=1000, rebuild_rollups=True):
+        rejected = await super().add_many(points, batch, rebuild_rollups)
+        window = self.window
+        if window is not None:
+            await self.warm_up(window.horizon_sec)  # cheaper than inserting the old points one by one
+        return rejected
+
     async def select_average_ago(self, ago, tolerance):
-        items = await self.select(*self.range_ago(ago, tolerance))
-        n, accum = 0, 0
-        for _, item in items:
-            price = float(item[self.KEY])
-            if price > 0:
-                n += 1
-                accum += price
-        if n:
-            return accum / n
-        else:
-            return 0
+        start, end = self.range_ago(ago, tolerance)
+        window = self.window
+        if window is not None and window.covers(start / 1000):
+            return window.average(start / 1000, end / 1000) or 0
 
-    async def get_last_values(self, period_sec, key=None, max_points=10000, tolerance_sec=10, with_ts=True):
+        stats = await self.aggregate(start, end, self.KEY, positive_only=True)
+        return stats.avg if stats else 0
+
+    async def get_last_values(self, period_sec, key=None, max_points=10000, tolerance_sec=10, with_ts=True,
+                              target_points=None):
         key = key or self.KEY
-        return await super().get_last_values(period_sec, key, max_points, tolerance_sec, with_ts)
+        return await super().get_last_values(period_sec, key, max_points, tolerance_sec, with_ts,
+                                             target_points=target_points)
+
+
+class TimeSeriesCompactor:
+    """
+    Periodically applies the age retention to every time series stream in Redis (raw and rollups)
+    """
+
+    def __init__(self, db: DB, period=3600, scan_batch=200):
+        self.db = db
+        self.period = period
+        self.scan_batch = scan_batch
+        self.logger = logging.getLogger('TimeSeriesCompactor')
+
+    async def compact_once(self):
+        total, n_streams = 0, 0
+        async for keys in scan_batches(self.db, f'{TimeSeries.STREAM_PREFIX}:*', self.scan_batch):
+            for key in keys:
+                try:
+                    total += await TimeSeries.trim_stream(self.db, key)
+                    n_streams += 1
+                except Exception as e:
+                    self.logger.error(f'failed to trim {key}: {e}')
+        self.logger.info(f'compacted {n_streams} streams; {total} entries deleted')
+        return total
+
+    async def run(self):
+        while True:
+            try:
+                await self.compact_once()
+            except Exception as e:
+                self.logger.exception(f'compaction error: {e}')
+            await asyncio.sleep(self.period)
@@ -1,7 +1,11 @@
-from dataclasses import dataclass, field
-from statistics import median
+import json
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Dict
 
 from services.lib.db import DB
+from services.lib.keyspace import unlink_matching
+from services.lib.rolling_stats import RollingQuantiles
 from services.lib.utils import linear_transform
 from services.models.pool_info import MIDGARD_MULT
 from services.models.cap_info import BaseModelMixin
@@ -21,7 +25,7 @@ class StakeTx(BaseModelMixin):
     full_usd: float
     asset_per_rune: float
 
-    KEY_PREFIX = 'tx_not'
+    KEY_PREFIX = 'tx_not'  # legacy per-tx keys
 
     @classmethod
     def load_from_midgard(cls, j):
@@ -79,22 +83,99 @@ class StakeTx(BaseModelMixin):
         self.full_rune = self.asset_amount / asset_per_rune + self.rune_amount
         return self.full_rune
 
-    @property
-    def notify_key(self):
-        return f"{self.KEY_PREFIX}:{self.hash}"
+    KEY_NOTIFIED = 'tx_notified'  # sorted set: tx hash scored by tx date
 
     @classmethod
     async def clear_all_data(cls, db: DB):
         r = await db.get_redis()
-        keys = await r.keys(f'{cls.KEY_PREFIX}:*')
-        if keys:
-            await r.delete(*keys)
+        await r.unlink(cls.KEY_NOTIFIED)
+
+    @classmethod
+    async def clear_legacy_markers(cls, db: DB, batch=500):
+        """
+        Removes the old per-tx "tx_not:{hash}" keys (no TTL) incrementally, without KEYS.
+        Call it only when the dedup horizon has passed since the deploy: which_notified migrates the markers
+        of the txs it sees, the rest are older than the horizon then.
+        """
+        await unlink_matching(db, f'{cls.KEY_PREFIX}:*', batch)
 
     async def is_notified(self, db: DB):
-        return bool(await db.redis.get(self.notify_key))
+        flags = await self.which_notified(db, [self])
+        return flags[0]
+
+    @property
+    def legacy_notify_key(self):
+        return f"{self.KEY_PREFIX}:{self.hash}"
+
+    @classmethod
+    async def which_notified(cls, db: DB, txs: List['StakeTx']) -> List[bool]:
+        """
+        Bulk version of is_notified: one pipelined round trip for the whole list.
+        Also honors the legacy "tx_not:{hash}" markers and moves the found ones to the sorted set.
+        """
+        if not txs:
+            return []
+        r = await db.get_redis()
+        pipe = r.pipeline()
+        in_set = [pipe.zscore(cls.KEY_NOTIFIED, tx.hash) for tx in txs]
+        legacy = [pipe.exists(tx.legacy_notify_key) for tx in txs]
+        await pipe.execute()
+
+        flags = [f.result() is not None for f in in_set]
+        migrated = [tx for tx, f, lf in zip(txs, flags, legacy) if not f and lf.result()]
+        if migrated:
+            await cls.mark_notified(db, migrated)
+            await r.unlink(*(tx.legacy_notify_key for tx in migrated))
+        return [f or bool(lf.result()) for f, lf in zip(flags, legacy)]
+
+    async def set_notified(self, db: DB):
+        await self.mark_notified(db, [self])
+
+    @classmethod
+    async def mark_notified(cls, db: DB, txs: List['StakeTx']):
+        if not txs:
+            return
+        r = await db.get_redis()
+        pairs = []
+        for tx in txs:
+            pairs += [tx.date, tx.hash]
+        await r.zadd(cls.KEY_NOTIFIED, *pairs)
+
+    @classmethod
+    async def prune_notified(cls, db: DB, max_age_sec, now=None):
+        """
+        Forgets markers of txs older than max_age_sec; O(log(N) + M) instead of a keyspace scan
+        """
+        now = now or time.time()
+        r = await db.get_redis()
+        return await r.zremrangebyscore(cls.KEY_NOTIFIED, max=now - max_age_sec)
+
+
+@dataclass
+class TxWatermark(BaseModelMixin):
+    """
+    The newest (date, hash) of the tx feed that was processed; older txs need not be fetched again
+    """
+    date: int = 0
+    hash: str = ''
 
-    async def set_notified(self, db: DB, value=1):
-        await db.redis.set(self.notify_key, value)
+    KEY = 'tx_watermark'
+
+    def is_reached_by(self, tx: StakeTx):
+        return tx.hash == self.hash or tx.date < self.date
+
+    @classmethod
+    async def load(cls, db: DB) -> Optional['TxWatermark']:
+        r = await db.get_redis()
+        raw = await r.get(cls.KEY)
+        try:
+            return cls.from_json(raw) if raw else None
+        except (TypeError, ValueError):
+            return None
+
+    async def save(self, db: DB):
+        r = await db.get_redis()
+        await r.set(self.KEY, self.as_json)
 
 
 @dataclass
@@ -102,11 +183,30 @@ class StakePoolStats(BaseModelMixin):
     pool: str
     last_tx: str = ''
     usd_depth: float = 0.0
-    tx_acc: list = field(default_factory=list)
+    tx_sizes: str = ''  # packed RollingQuantiles of rune amounts
+    window: int = 50
 
     KEY_PREFIX = 'stake-pool-stats-v2'
     KEY_POOL_DEPTH = 'POOL-DEPTH'
 
+    def __post_init__(self):
+        self._tracker = RollingQuantiles.decode(self.tx_sizes, self.window)
+
+    @property
+    def as_json(self):
+        self.tx_sizes = self._tracker.encode()
+        return super().as_json
+
+    @classmethod
+    def from_json(cls, jstr):
+        d = json.loads(jstr)
+        old_tx_acc = d.pop('tx_acc', None)
+        if old_tx_acc is not None:  # migrate the old list of dicts
+            window = max(d.get('window', 50), len(old_tx_acc))
+            tracker = RollingQuantiles(window, (tx['rune_amount'] for tx in old_tx_acc))
+            d['tx_sizes'], d['window'] = tracker.encode(), window
+        return cls(**d)
+
     @property
     def key(self):
         return f"{self.KEY_PREFIX}:{self.pool}"
@@ -118,32 +218,59 @@ class StakePoolStats(BaseModelMixin):
     @classmethod
     async def get_from_db(cls, pool, db: DB):
         r = await db.get_redis()
-        empty = cls(pool, '', 1, [])
+        empty = cls(pool, '', 1)
         old_j = await r.get(empty.key)
         return cls.from_json(old_j) if old_j else empty
 
+    @classmethod
+    async def get_many_from_db(cls, pools, db: DB) -> Dict[str, 'StakePoolStats']:
+        """
+        Bulk version of get_from_db: one MGET for all pools
+        """
+        pools = list(pools)
+        if not pools:
+            return {}
+        r = await db.get_redis()
+        old_js = await r.mget(*[cls(pool).key for pool in pools])
+        return {
+            pool: (cls.from_json(old_j) if old_j else cls(pool, '', 1)) for pool, old_j in zip(pools, old_js)
+        }
+
+    @classmethod
+    async def save_many(cls, db: DB, stats: List['StakePoolStats'], with_time_series=True):
+        """
+        Saves the stats (and writes their depth time series) in one pipeline
+        """
+        if not stats:
+            return
+        r = await db.get_redis()
+        pipe = r.pipeline()
+        for stat in stats:
+            pipe.set(stat.key, stat.as_json)
+            if with_time_series:
+                TimeSeries(stat.stream_name, db).add_to_pipeline(pipe, usd_depth=stat.usd_depth)
+        await pipe.execute()
+
     def update(self, rune_amount, max_n=50):
-        self.tx_acc.append({
-            'rune_amount': rune_amount
-        })
-        n = len(self.tx_acc)
-        if n > max_n:
-            self.tx_acc = self.tx_acc[(n - max_n):]
+        if max_n != self.window:
+            self.window = max_n
+            self._tracker.resize(max_n)
+        self._tracker.push(rune_amount)
 
     @property
     def n_elements(self):
-        return len(self.tx_acc)
+        return len(self._tracker)
 
     @property
     def median_rune_amount(self):
-        return median(tx['rune_amount'] for tx in self.tx_acc) if self.tx_acc else 0.0
+        return self._tracker.median
+
+    def rune_amount_quantile(self, q):
+        return self._tracker.quantile(q)
 
     @classmethod
     async def clear_all_data(cls, db: DB):
-        r = await db.get_redis()
-        keys = await r.keys(f'{cls.KEY_PREFIX}:*')
-        if keys:
-            await r.delete(*keys)
+        await unlink_matching(db, f'{cls.KEY_PREFIX}:*')
 
     @property
     def stream_name(self):
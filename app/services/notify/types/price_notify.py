@@ -10,10 +10,13 @@ from services.lib.cooldown import CooldownSingle
 from services.lib.datetime import MINUTE, HOUR, DAY, parse_timespan_to_seconds
 from services.lib.depcont import DepContainer
 from services.lib.money import pretty_money, calc_percent_change
+from services.lib.state_cache import ModelCodec
 from services.lib.texts import MessageType, BoardMessage
 from services.models.price import RuneFairPrice, PriceReport, PriceATH
 from services.models.time_series import PriceTimeSeries, RUNE_SYMBOL
 
+ATH_CODEC = ModelCodec(PriceATH)
+
 
 class PriceNotifier(INotified):
     def __init__(self, deps: DepContainer):
@@ -58,7 +61,7 @@ class PriceNotifier(INotified):
         await self.deps.broadcaster.broadcast(user_lang_map.keys(), sticker, message_type=MessageType.STICKER)
 
     async def do_notify_price_table(self, fair_price, hist_prices, ath, last_ath=None):
-        await self.cd.do(self.CD_KEY_PRICE_NOTIFIED)
+        await self.cd.do(self.CD_KEY_PRICE_NOTIFIED)  # any price table postpones the next global one
 
         btc_price = self.deps.price_holder.btc_per_rune
         report = PriceReport(*hist_prices, fair_price, last_ath, btc_price)
@@ -85,16 +88,15 @@ class PriceNotifier(INotified):
             percent_change = calc_percent_change(price_1h, price)
 
             if abs(percent_change) >= self.percent_change_threshold:  # significant price change
-                if percent_change > 0 and (await self.cd.can_do(self.CD_KEY_PRICE_RISE_NOTIFIED, self.change_cd)):
+                if percent_change > 0 and (await self.cd.try_acquire(self.CD_KEY_PRICE_RISE_NOTIFIED, self.change_cd)):
                     self.logger.info(f'price rise {pretty_money(percent_change)} %')
-                    await self.cd.do(self.CD_KEY_PRICE_RISE_NOTIFIED)
                     send_it = True
-                elif percent_change < 0 and (await self.cd.can_do(self.CD_KEY_PRICE_FALL_NOTIFIED, self.change_cd)):
+                elif percent_change < 0 and (await self.cd.try_acquire(self.CD_KEY_PRICE_FALL_NOTIFIED,
+                                                                       self.change_cd)):
                     self.logger.info(f'price fall {pretty_money(percent_change)} %')
-                    await self.cd.do(self.CD_KEY_PRICE_FALL_NOTIFIED)
                     send_it = True
 
-        if not send_it and await self.cd.can_do(self.CD_KEY_PRICE_NOTIFIED, self.global_cd):
+        if not send_it and await self.cd.try_acquire(self.CD_KEY_PRICE_NOTIFIED, self.global_cd):
             self.logger.info('no price change but it is long time elapsed (global cd), so notify anyway')
             send_it = True
 
@@ -103,22 +105,17 @@ class PriceNotifier(INotified):
 
     async def get_prev_ath(self) -> PriceATH:
         try:
-            await self.deps.db.get_redis()
-            ath_str = await self.deps.db.redis.get(self.ATH_KEY)
-            if ath_str is None:
-                return PriceATH()
-            else:
-                return PriceATH.from_json(ath_str)
+            ath = await self.deps.db.state.get(self.ATH_KEY, ATH_CODEC)
+            return ath if ath is not None else PriceATH()
         except (TypeError, ValueError, AttributeError):
             return PriceATH()
 
     async def reset_ath(self):
-        await self.deps.db.redis.delete(self.ATH_KEY)
+        self.deps.db.state.delete(self.ATH_KEY)
 
     async def update_ath(self, ath: PriceATH):
         if ath.ath_price > 0:
-            await self.deps.db.get_redis()
-            await self.deps.db.redis.set(self.ATH_KEY, ath.as_json)
+            self.deps.db.state.set(self.ATH_KEY, ath, ATH_CODEC)
 
     async def handle_ath(self, fair_price):
         last_ath = await self.get_prev_ath()
@@ -128,8 +125,7 @@ class PriceNotifier(INotified):
                 int(time.time()), price
             ))
 
-            if await self.cd.can_do(self.CD_KEY_ATH_NOTIFIED, self.ath_cooldown):
-                await self.cd.do(self.CD_KEY_ATH_NOTIFIED)
+            if await self.cd.try_acquire(self.CD_KEY_ATH_NOTIFIED, self.ath_cooldown):
                 await self.cd.do(self.CD_KEY_PRICE_RISE_NOTIFIED)  # prevent 2 notifications
 
                 hist_prices = await self.historical_get_triplet()
@@ -4,9 +4,10 @@ from localization import BaseLocalization
 from services.dialog.queue_picture import queue_graph, QUEUE_TIME_SERIES
 from services.fetch.base import INotified
 from services.fetch.queue import QueueInfo
-from services.lib.cooldown import CooldownSingle, Cooldown
+from services.lib.cooldown import CooldownSingle
 from services.lib.datetime import parse_timespan_to_seconds, HOUR
 from services.lib.depcont import DepContainer
+from services.lib.rollup import DEFAULT_ROLLUPS
 from services.lib.texts import BoardMessage
 from services.models.time_series import TimeSeries
 
@@ -52,8 +53,6 @@ class QueueNotifier(INotified):
         k_packed = key_gen('packed')
 
         cdt = self.cooldown_tracker
-        free_notified_recently = not (await cdt.can_do(k_free, self.cooldown))
-        congested_notified_recently = not (await cdt.can_do(k_packed, self.cooldown))
 
         avg_value = await ts.average(self.avg_period, key)
         if avg_value is None:
@@ -62,20 +61,20 @@ class QueueNotifier(INotified):
         self.logger.info(f'Avg {key} is {avg_value:.1f}')
 
         if avg_value > self.threshold_congested:
-            if not congested_notified_recently:
+            if await cdt.try_acquire(k_packed, self.cooldown):
                 await cdt.clear(k_free)
-                await cdt.do(k_packed)
                 await self.notify(item_type, self.threshold_congested, int(avg_value))
         elif avg_value < self.threshold_free:
-            if not free_notified_recently and congested_notified_recently:
+            # "free" only follows a recent "congested" notification
+            congested_notified_recently = not (await cdt.can_do(k_packed, self.cooldown))
+            if congested_notified_recently and await cdt.try_acquire(k_free, self.cooldown):
                 await cdt.clear(k_packed)
-                await cdt.do(k_free)
                 await self.notify(item_type, 0, 0)
 
     async def on_data(self, sender, data: QueueInfo):
         self.logger.info(f"got queue: {data}")
 
-        ts = TimeSeries(QUEUE_TIME_SERIES, self.deps.db)
+        ts = TimeSeries(QUEUE_TIME_SERIES, self.deps.db, rollups=DEFAULT_ROLLUPS)
         await ts.add(swap_queue=data.swap, outbound_queue=data.outbound)
         self.deps.queue_holder = data
 
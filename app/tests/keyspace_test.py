@@ -0,0 +1,51 @@
+import asyncio
+
+from services.lib.keyspace import keyspace_report, unlink_matching
+
+
+class StubRedis:
+    def __init__(self, sizes):
+        self.sizes = sizes  # key -> MEMORY USAGE reply
+
+    async def iscan(self, match='*', count=None):
+        for key in list(self.sizes):
+            yield key
+
+    async def execute(self, *args):
+        assert args[:2] == (b'MEMORY', b'USAGE')
+        return self.sizes.get(args[2])
+
+    async def unlink(self, *keys):
+        for key in keys:
+            del self.sizes[key]
+        return len(keys)
+
+
+class StubDB:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get_redis(self):
+        return self.redis
+
+
+def test_keyspace_report():
+    redis = StubRedis({
+        b'ts-stream:price-A': 1000,
+        b'ts-stream:price-B': 500,
+        b'user:lang:1': 50,
+        b'user:lang:2': None,  # gone meanwhile
+        b'th_info': 70,
+    })
+    report = asyncio.run(keyspace_report(StubDB(redis), prefixes=['ts-stream:'], batch=2))
+    assert {k: (v.keys, v.memory_bytes) for k, v in report.items()} == {
+        'ts-stream:': (2, 1500),
+        'user': (2, 50),
+        'th_info': (1, 70),
+    }
+
+
+def test_unlink_matching():
+    redis = StubRedis({b'a': 1, b'b': 2, b'c': 3})
+    assert asyncio.run(unlink_matching(StubDB(redis), '*', batch=2)) == 3
+    assert not redis.sizes
@@ -0,0 +1,39 @@
+import random
+
+from services.fetch.node_score import NodeScoreBoard
+
+
+def test_penalize_and_recover():
+    sb = NodeScoreBoard(penalty_sec=100)
+    sb.penalize('1.1.1.1')
+    assert sb.healthy(['1.1.1.1', '2.2.2.2']) == ['2.2.2.2']
+
+    sb.penalize('1.1.1.1', period=0)
+    assert sb.healthy(['1.1.1.1', '2.2.2.2']) == ['1.1.1.1', '2.2.2.2']
+
+
+def test_errors_lead_to_penalty():
+    sb = NodeScoreBoard(min_samples=3, max_error_rate=0.3)
+    for _ in range(5):
+        sb.report_error('1.1.1.1')
+    assert sb.is_penalized('1.1.1.1')
+
+
+def test_weighted_sample_prefers_fast_nodes():
+    sb = NodeScoreBoard()
+    sb.report_success('fast', 0.05)
+    sb.report_success('slow', 3.0)
+    rng = random.Random(42)
+    picks = [sb.weighted_sample(['fast', 'slow'], 1, rng)[0] for _ in range(200)]
+    assert picks.count('fast') > picks.count('slow') * 5
+    assert sorted(sb.weighted_sample(['fast', 'slow'], 2, rng)) == ['fast', 'slow']
+
+
+def test_censored_latency_only_grows():
+    sb = NodeScoreBoard()
+    sb.report_censored_latency('new', 0.02, penalty_latency=3.0)
+    assert sb.get('new').latency == 3.0
+
+    sb.report_success('known', 0.1)
+    sb.report_censored_latency('known', 0.02, penalty_latency=3.0)
+    assert sb.get('known').latency > 0.1
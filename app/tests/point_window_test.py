@@ -0,0 +1,27 @@
+from services.lib.point_window import RollingPointWindow
+
+
+def test_average_and_lookback():
+    w = RollingPointWindow(horizon_sec=100)
+    w.load([10, 20, 30], [1.0, 2.0, 3.0], covered_from=0)
+    w.push(40, 4.0)
+    w.push(25, 10.0)  # late point
+
+    assert w.average(20, 30) == 5.0
+    assert w.average(0, 1000) == 4.0
+    assert w.average(31, 39) is None
+    assert w.count(10, 40) == 5
+    assert w.last_before(27) == (25.0, 10.0)
+    assert w.last_before(5) is None
+    assert w.covers(0) and not w.covers(-1)
+
+
+def test_eviction():
+    w = RollingPointWindow(horizon_sec=50)
+    w.load([], [], covered_from=0)
+    for t in range(1000):
+        w.push(t, t)
+    assert len(w) < 100
+    assert not w.covers(900)
+    assert w.covers(950)
+    assert w.average(990, 999) == sum(range(990, 1000)) / 10
@@ -0,0 +1,36 @@
+import random
+from statistics import median
+
+from services.lib.rolling_stats import RollingQuantiles
+
+
+def test_median_matches_window():
+    rng = random.Random(1)
+    rq = RollingQuantiles(capacity=7)
+    data = []
+    for _ in range(100):
+        x = rng.uniform(0, 1000)
+        rq.push(x)
+        data.append(x)
+        assert abs(rq.median - median(data[-7:])) < 1e-9
+    assert len(rq) == 7
+    assert rq.values == data[-7:]
+
+
+def test_quantiles():
+    rq = RollingQuantiles(capacity=100, values=range(101))
+    assert rq.quantile(0.0) == 1
+    assert rq.quantile(1.0) == 100
+    assert rq.quantile(0.5) == 50.5
+    assert RollingQuantiles().median == 0.0
+
+
+def test_encode_decode_and_resize():
+    rq = RollingQuantiles(capacity=5, values=[5, 1, 4, 2, 3, 9])
+    restored = RollingQuantiles.decode(rq.encode(), capacity=5)
+    assert restored.values == [1, 4, 2, 3, 9]
+    assert restored.median == 3
+
+    restored.resize(3)
+    assert restored.values == [2, 3, 9]
+    assert RollingQuantiles.decode('', 10).values == []
@@ -0,0 +1,33 @@
+from services.lib.datetime import MINUTE, HOUR, DAY
+from services.lib.rollup import aggregate_buckets, encode_rollup_fields, choose_resolution, rollup_entry_as_raw
+
+
+def test_aggregate_raw_and_rollup():
+    raw = [
+        (b'60000-0', {b'price': b'1.0', b'json': b'{}'}),
+        (b'61000-0', {b'price': b'3.0'}),
+        (b'119999-1', {b'price': b'2.0'}),
+        (b'120000-0', {b'price': b'10.0'}),
+    ]
+    buckets = aggregate_buckets(raw, MINUTE)
+    assert sorted(buckets.keys()) == [60000, 120000]
+    b = buckets[60000]['price']
+    assert (b.min, b.max, b.avg, b.last, b.n) == (1.0, 3.0, 2.0, 2.0, 3)
+    assert 'json' not in buckets[60000]
+
+    rollup_entries = [
+        (f'{start}-0'.encode(), {k.encode(): str(v).encode() for k, v in encode_rollup_fields(fields).items()})
+        for start, fields in sorted(buckets.items())
+    ]
+    hourly = aggregate_buckets(rollup_entries, HOUR, from_rollup=True)
+    h = hourly[0]['price']
+    assert (h.min, h.max, h.avg, h.last, h.n) == (1.0, 10.0, 4.0, 10.0, 4)
+
+    assert rollup_entry_as_raw(rollup_entries[0][1]) == {b'price': b'2.0'}
+
+
+def test_choose_resolution():
+    assert choose_resolution(30 * DAY, 300) == HOUR
+    assert choose_resolution(DAY, 300) == MINUTE
+    assert choose_resolution(HOUR, 300) == 0
+    assert choose_resolution(2 * 365 * DAY, 300) == DAY
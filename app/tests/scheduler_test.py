@@ -0,0 +1,11 @@
+from services.lib.scheduler import FixedRateScheduler
+
+
+def test_advance_on_time():
+    assert FixedRateScheduler.advance(100.0, 101.0, 10.0) == (110.0, 0)
+    assert FixedRateScheduler.advance(100.0, 110.0, 10.0) == (110.0, 0)
+
+
+def test_advance_overrun_skips_slots():
+    assert FixedRateScheduler.advance(100.0, 111.0, 10.0) == (120.0, 1)
+    assert FixedRateScheduler.advance(100.0, 135.0, 10.0) == (140.0, 3)
@@ -0,0 +1,122 @@
+import asyncio
+from dataclasses import dataclass
+
+from services.lib.state_cache import StateCache, ModelCodec, FLOAT, STR
+from services.models.base import BaseModelMixin
+
+
+class FlakyPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value):
+        self.ops.append((key, value))
+
+    def unlink(self, key):
+        self.ops.append((key, None))
+
+    async def execute(self):
+        if self.redis.failures:
+            self.redis.failures -= 1
+            raise ConnectionError('redis is down')
+        for key, value in self.ops:
+            self.redis.data[key] = value
+
+
+class FlakyRedis:
+    def __init__(self, failures):
+        self.failures = failures
+        self.data = {}
+
+    def pipeline(self):
+        return FlakyPipeline(self)
+
+
+class StubDB:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get_redis(self):
+        return self.redis
+
+
+def test_write_behind_retries():
+    async def scenario():
+        redis = FlakyRedis(failures=2)
+        cache = StateCache(StubDB(redis), flush_delay=0.01)
+        cache.set('th_info', '{}')
+        assert await cache.get('th_info') == b'{}'  # served from memory before the flush
+        await asyncio.sleep(0.2)
+        cache.set('user:lang:1', 'eng')  # written while the flush task may still be alive
+        await asyncio.sleep(0.2)
+        return redis, cache
+
+    redis, cache = asyncio.run(scenario())
+    assert redis.data == {'th_info': b'{}', 'user:lang:1': b'eng'}
+    assert cache.stats['pending'] == 0
+
+
+class SlowRedis:
+    """
+    GET/MGET answer with the data as it was when called, after the test lets them go
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.failures = 0
+        self.release = asyncio.Event()
+
+    async def get(self, key):
+        value = self.data.get(key)
+        await self.release.wait()
+        return value
+
+    async def mget(self, *keys):
+        values = [self.data.get(key) for key in keys]
+        await self.release.wait()
+        return values
+
+    def pipeline(self):
+        return FlakyPipeline(self)
+
+
+def test_read_does_not_overwrite_newer_write():
+    async def scenario():
+        redis = SlowRedis({'cd_evt:a': b'1.0', 'cd_evt:b': b'1.0'})
+        cache = StateCache(StubDB(redis), flush_delay=0.01)
+        read_one = asyncio.create_task(cache.get('cd_evt:a', FLOAT))
+        read_many = asyncio.create_task(cache.get_many(['cd_evt:a', 'cd_evt:b'], FLOAT))
+        await asyncio.sleep(0)
+        cache.set('cd_evt:a', 2.0, FLOAT)  # while the reads are waiting for Redis
+        redis.release.set()
+        results = await read_one, await read_many
+        return results, await cache.get('cd_evt:a', FLOAT), await cache.get('cd_evt:b', FLOAT)
+
+    (one, many), a, b = asyncio.run(scenario())
+    assert one == 2.0
+    assert many == [2.0, 1.0]
+    assert (a, b) == (2.0, 1.0)
+
+
+def test_typed_values():
+    @dataclass
+    class Info(BaseModelMixin):
+        cap: int = 0
+
+    async def scenario():
+        redis = FlakyRedis(failures=0)
+        cache = StateCache(StubDB(redis), flush_delay=0.01)
+        codec = ModelCodec(Info)
+        cache.set('th_info', Info(10), codec)
+        info = await cache.get('th_info', codec)
+        info.cap = 20  # the caller's copy
+        cache.set('user:lang:1', 'eng', STR)
+        await asyncio.sleep(0.1)
+        return redis, info, await cache.get('th_info', codec), await cache.get('user:lang:1', STR)
+
+    redis, info, again, lang = asyncio.run(scenario())
+    assert info == Info(20)
+    assert again == Info(10)
+    assert lang == 'eng'
+    assert redis.data == {'th_info': b'{"cap": 10}', 'user:lang:1': b'eng'}
@@ -0,0 +1,36 @@
+import math
+
+import pytest
+
+from services.lib.datetime import series_to_pandas
+from services.lib.stream_columns import decode_stream_ids, stream_to_columns
+
+ENTRIES = [
+    (b'1000-0', {b'swap_queue': b'1', b'outbound_queue': b'5'}),
+    (b'2000-3', {b'swap_queue': b'2.5'}),
+    (b'3000-100', {b'swap_queue': b'7', b'outbound_queue': b'0'}),
+]
+
+
+def test_decode_ids_and_columns():
+    ms, seq = decode_stream_ids([e[0] for e in ENTRIES])
+    assert ms.tolist() == [1000, 2000, 3000]
+    assert seq.tolist() == [0, 3, 100]
+
+    cols = stream_to_columns(ENTRIES)
+    assert list(cols.keys()) == ['ms', 'seq', 'swap_queue', 'outbound_queue']
+    assert cols['swap_queue'].tolist() == [1.0, 2.5, 7.0]
+    oq = cols['outbound_queue'].tolist()
+    assert oq[0] == 5.0 and math.isnan(oq[1]) and oq[2] == 0.0
+
+    assert stream_to_columns([])['ms'].size == 0
+
+
+def test_series_to_pandas():
+    df = series_to_pandas(ENTRIES)
+    assert len(df) == 2  # seq > 99 is skipped
+    assert df['t'].tolist() == pytest.approx([0.0, 1.03])
+    assert df['swap_queue'].tolist() == [1.0, 2.5]
+
+    df = series_to_pandas(ENTRIES, shift_time=False)
+    assert df['t'].tolist() == pytest.approx([1.0, 2.03])
@@ -0,0 +1,132 @@
+import asyncio
+
+from services.fetch.node_score import NodeScoreBoard
+from services.fetch.thor_node import ThorNode
+
+
+class StubResponse:
+    def __init__(self, text, status=200):
+        self._text = text
+        self.status = status
+
+    async def text(self):
+        return self._text
+
+
+class StubRequest:
+    def __init__(self, session, url):
+        self.session = session
+        self.ip = url.split('//')[1].split(':')[0]
+
+    async def __aenter__(self):
+        self.session.requests.append(self.ip)
+        delay, text = self.session.nodes[self.ip]
+        await asyncio.sleep(delay)
+        return StubResponse(text)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class StubSession:
+    def __init__(self, nodes):
+        self.nodes = nodes  # ip -> (delay sec, response text)
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        return StubRequest(self, url)
+
+
+class StubNodeManager:
+    def __init__(self, ips):
+        self.ips = ips
+        self.scores = NodeScoreBoard()
+
+    @staticmethod
+    def connection_url(ip, path=''):
+        return f'http://{ip}:1317{path}'
+
+    async def select_nodes(self, n):
+        return self.ips[:n]
+
+
+def make_thor_node(nodes, agree=2):
+    man = StubNodeManager(list(nodes.keys()))
+    return ThorNode(man, StubSession(nodes), cohort_size=len(nodes), consensus=agree), man
+
+
+def test_cancelled_slow_node_is_not_scored_fast():
+    tn, man = make_thor_node({
+        'a': (0.01, '{"x": 1}'),
+        'b': (0.02, '{"x": 1}'),
+        'c': (0.5, '{"x": 1}'),
+    })
+    assert asyncio.run(tn.request('/pool')) == {'x': 1}
+    assert man.scores.get('c').latency > man.scores.get('b').latency * 10
+
+
+def test_quorum_returns_early_and_skips_empty_responses():
+    tn, man = make_thor_node({
+        'empty': (0.0, ''),
+        'a': (0.01, '{"x": 1}'),
+        'odd': (0.01, '{"x": 2}'),
+        'b': (0.02, '{"x": 1}'),
+        'slow': (5.0, '{"x": 1}'),
+    })
+
+    async def run():
+        loop = asyncio.get_event_loop()
+        t0 = loop.time()
+        result = await tn.request('/pool')
+        return result, loop.time() - t0
+
+    result, elapsed = asyncio.run(run())
+    assert result == {'x': 1}
+    assert elapsed < 1.0  # didn't wait for the slow node: it was cancelled
+    assert man.scores.get('odd').disagree_rate > 0
+    assert man.scores.get('a').disagree_rate == 0
+
+
+def test_no_quorum():
+    tn, _ = make_thor_node({
+        'a': (0.01, '{"x": 1}'),
+        'b': (0.01, '{"x": 2}'),
+        'c': (0.01, ''),
+    })
+    assert asyncio.run(tn.request('/pool')) is None
+
+
+def test_single_flight_shares_one_round():
+    tn, _ = make_thor_node({
+        'a': (0.05, '{"x": [1]}'),
+        'b': (0.05, '{"x": [1]}'),
+    })
+
+    async def run():
+        results = await asyncio.gather(tn.request('/pool'), tn.request('pool'))
+        return results, dict(tn._in_flight)
+
+    (r1, r2), in_flight = asyncio.run(run())
+    assert r1 == r2 == {'x': [1]}
+    assert r1 is not r2  # every caller parses its own copy
+    assert len(tn.session.requests) == 2  # one round for both callers
+    assert not in_flight
+
+
+def test_cancelled_caller_does_not_cancel_the_round():
+    tn, _ = make_thor_node({
+        'a': (0.05, '{"x": 1}'),
+        'b': (0.05, '{"x": 1}'),
+    })
+
+    async def run():
+        impatient = asyncio.create_task(tn.request('/pool'))
+        patient = asyncio.create_task(tn.request('/pool'))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient, impatient.cancelled()
+
+    result, was_cancelled = asyncio.run(run())
+    assert result == {'x': 1}
+    assert was_cancelled
+    assert len(tn.session.requests) == 2
@@ -0,0 +1,135 @@
+import asyncio
+
+from services.lib.datetime import MINUTE, HOUR
+from services.lib.rollup import parse_stream_id
+from services.models.time_series import TimeSeries
+
+T0 = 1_600_000_000_000 - 1_600_000_000_000 % (HOUR * 1000)  # aligned to the hour, long closed
+
+
+class StreamError(Exception):
+    pass
+
+
+def _bytes(v):
+    return v if isinstance(v, bytes) else str(v).encode()
+
+
+def _bound(ident, default_seq):
+    if isinstance(ident, int):
+        return ident, default_seq
+    ms, _, seq = str(ident).partition('-')
+    return int(ms), int(seq) if seq else default_seq
+
+
+class StubPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def xadd(self, *args, **kwargs):
+        self.ops.append((args, kwargs))
+
+    async def execute(self, return_exceptions=False):
+        results = []
+        for args, kwargs in self.ops:
+            try:
+                results.append(await self.redis.xadd(*args, **kwargs))
+            except StreamError as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+
+class StubStreamRedis:
+    """
+    Streams as sorted lists; like Redis, an ID must be greater than the last one ever added to the stream
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.last_ids = {}
+
+    def pipeline(self):
+        return StubPipeline(self)
+
+    async def xadd(self, stream, fields, message_id=b'*', max_len=None):
+        ident = parse_stream_id(message_id)
+        if ident <= self.last_ids.get(stream, (0, 0)):
+            raise StreamError('The ID specified in XADD is equal or smaller than the target stream top item')
+        self.last_ids[stream] = ident
+        self.streams.setdefault(stream, []).append(
+            (f'{ident[0]}-{ident[1]}'.encode(), {_bytes(k): _bytes(v) for k, v in fields.items()}))
+
+    async def xrange(self, stream, start='-', stop='+', count=None):
+        start = (0, 0) if start == '-' else _bound(start, 0)
+        stop = (2 ** 63, 0) if stop == '+' else _bound(stop, 2 ** 63)
+        entries = [e for e in self.streams.get(stream, []) if start <= parse_stream_id(e[0]) <= stop]
+        return entries[:count] if count else entries
+
+    async def xrevrange(self, stream, count=None):
+        entries = self.streams.get(stream, [])[::-1]
+        return entries[:count] if count else entries
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.streams.pop(key, None)
+            self.last_ids.pop(key, None)
+
+    async def exists(self, key):
+        return int(key in self.streams)
+
+    async def rename(self, key, new_key):
+        self.streams[new_key] = self.streams.pop(key)
+        self.last_ids[new_key] = self.last_ids.pop(key)
+
+
+class StubDB:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get_redis(self):
+        return self.redis
+
+
+def points(start_ms, n, step_ms, price):
+    return [(f'{start_ms + k * step_ms}-0', {'price': price}) for k in range(n)]
+
+
+def rollup(redis, ts, resolution):
+    return {parse_stream_id(ident)[0]: fields for ident, fields in
+            redis.streams.get(ts.rollup_stream_name(resolution), [])}
+
+
+def test_backfill_keeps_old_rollups():
+    async def scenario():
+        redis = StubStreamRedis()
+        ts = TimeSeries('backfill-test', StubDB(redis), rollups=(MINUTE, HOUR))
+        await ts.add_many(points(T0, 3 * 60, MINUTE * 1000, 1.0))  # hours 0-2, one point a minute
+        old_hourly = rollup(redis, ts, HOUR)
+
+        # the retention has trimmed the raw points of the hour 0
+        raw = redis.streams[ts.stream_name]
+        redis.streams[ts.stream_name] = [e for e in raw if parse_stream_id(e[0])[0] >= T0 + HOUR * 1000]
+
+        # late points of the hour 2 and new ones of the hour 3
+        rejected = await ts.add_many(points(T0 + 3 * HOUR * 1000 - 30_000, 4, 10_000, 5.0))
+        new_minutes = rollup(redis, ts, MINUTE)
+        await ts.rebuild_rollups()  # everything: still keeps what the raw points can't give back
+        assert rollup(redis, ts, MINUTE) == new_minutes
+        return redis, ts, old_hourly, rejected
+
+    redis, ts, old_hourly, rejected = asyncio.run(scenario())
+    assert rejected == []
+    hourly = rollup(redis, ts, HOUR)
+    assert sorted(hourly) == [T0, T0 + HOUR * 1000, T0 + 2 * HOUR * 1000, T0 + 3 * HOUR * 1000]
+    assert hourly[T0] == old_hourly[T0]  # not rebuilt: its raw points are gone
+    assert hourly[T0 + HOUR * 1000] == old_hourly[T0 + HOUR * 1000]
+    assert hourly[T0 + 2 * HOUR * 1000][b'price_n'] == b'63'
+    assert hourly[T0 + 3 * HOUR * 1000][b'price_n'] == b'1'
+
+    minutes = rollup(redis, ts, MINUTE)
+    assert len(minutes) == 3 * 60 + 1
+    assert minutes[T0][b'price_avg'] == b'1.0'
+    assert minutes[T0 + 3 * HOUR * 1000 - MINUTE * 1000][b'price_n'] == b'4'
@@ -0,0 +1,24 @@
+import asyncio
+import logging
+
+from services.lib.db import DB
+from services.lib.keyspace import keyspace_report
+from services.models.time_series import TimeSeries
+
+
+async def main(db):
+    report = await keyspace_report(db, prefixes=[f'{TimeSeries.STREAM_PREFIX}:'])
+    total_keys = sum(s.keys for s in report.values())
+    total_mem = sum(s.memory_bytes for s in report.values())
+    for prefix, stats in sorted(report.items(), key=lambda kv: kv[1].memory_bytes, reverse=True):
+        print(f'{prefix:<40} {stats.keys:>10} keys {stats.memory_bytes / 1024:>12.1f} KiB')
+    print(f'{"total":<40} {total_keys:>10} keys {total_mem / 1024:>12.1f} KiB')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    loop = asyncio.get_event_loop()
+    db = DB(loop)
+
+    loop.run_until_complete(main(db))
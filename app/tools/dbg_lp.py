@@ -85,7 +85,7 @@ async def test_one_pool_picture_generator(d: DepContainer, addr, pool, hide):
         with open(PICKLE_PATH, 'wb') as f:
             pickle.dump(stake_report, f)
 
-    img = await lp_pool_picture(stake_report, d.loc_man.default, value_hidden=hide)
+    img = await lp_pool_picture(stake_report, d.loc_man.default, d.session, value_hidden=hide)
     img.save(PICTURE_PATH, "PNG")
     os.system(f'open "{PICTURE_PATH}"')
 
@@ -21,7 +21,7 @@ async def test_price_graph(d: DepContainer, renew=True):
         d.thor_man.session = d.session
 
         if renew:
-            await fill_rune_price_from_gecko(d.db, include_fake_det=True)
+            await fill_rune_price_from_gecko(d.db, d.session, include_fake_det=True)
 
         img = await price_graph_from_db(d.db, EnglishLocalization())
 